@@ -1,3 +1,124 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
 from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from orders.models import Order
+from products.models import Category, Product
+
+
+class AdminPanelTestCase(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin')
+        self.client.force_login(self.admin)
+        patcher = mock.patch('admin.views.ADMIN_PAGE_SIZE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def walk(self, url_name, listing, **params):
+        """Follow next_page_url to the last page, returning each page's rows"""
+        pages = []
+        response = self.client.get(reverse(url_name), params)
+        while True:
+            pages.append(list(response.context[listing]))
+            if not response.context['next_page_url']:
+                return pages
+            response = self.client.get(response.context['next_page_url'])
+
+
+class OrderManagementTests(AdminPanelTestCase):
+    def setUp(self):
+        super().setUp()
+        customer = User.objects.create_user('alice')
+        Order.objects.bulk_create([
+            Order(user=customer, order_id=f'FK{index}', status=status, total_amount=10,
+                  shipping_address='', phone_number='')
+            for index, status in enumerate(['pending', 'shipped', 'pending', 'delivered', 'pending'])
+        ])
+        # Same timestamp everywhere, so only the id tie-break orders the rows
+        Order.objects.update(created_at=timezone.now())
+
+    def test_pages_split_on_the_id_tie_break_without_gaps(self):
+        pages = self.walk('custom_admin:order_management', 'orders')
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            [order.pk for page in pages for order in page],
+            list(Order.objects.order_by('-id').values_list('pk', flat=True))
+        )
+
+    def test_exactly_full_page_has_no_next_page(self):
+        Order.objects.filter(order_id='FK4').delete()
+        pages = self.walk('custom_admin:order_management', 'orders', status='pending')
+        self.assertEqual([[order.order_id for order in page] for page in pages], [['FK2', 'FK0']])
+
+    def test_search_and_date_range_narrow_the_list(self):
+        response = self.client.get(reverse('custom_admin:order_management'), {'q': 'fk3', 'date_from': '2000-01-01'})
+        self.assertEqual([order.order_id for order in response.context['orders']], ['FK3'])
+        response = self.client.get(reverse('custom_admin:order_management'), {'date_to': '2000-01-01'})
+        self.assertEqual((list(response.context['orders']), response.context['total_orders']), ([], 0))
+
+    def test_status_counts_ignore_the_status_filter(self):
+        response = self.client.get(reverse('custom_admin:order_management'), {'status': 'pending'})
+        self.assertEqual(
+            (response.context['total_orders'], response.context['pending_orders'],
+             response.context['shipped_orders'], response.context['delivered_orders']),
+            (5, 3, 1, 1)
+        )
+        pages = self.walk('custom_admin:order_management', 'orders', status='pending')
+        self.assertEqual({order.status for page in pages for order in page}, {'pending'})
+        self.assertEqual(sum(len(page) for page in pages), 3)
+
+
+class UserManagementTests(AdminPanelTestCase):
+    def setUp(self):
+        super().setUp()
+        for name in ('alice', 'alan', 'bob', 'albert'):
+            User.objects.create_user(name, f'{name}@example.com', is_active=name != 'alan')
+        User.objects.update(date_joined=timezone.now())
+
+    def test_search_pages_through_prefix_matches(self):
+        pages = self.walk('custom_admin:user_management', 'users', q='AL')
+        self.assertEqual(
+            [[user.username for user in page] for page in pages], [['albert', 'alan'], ['alice']]
+        )
+
+    def test_stats_count_every_user_whatever_the_filter(self):
+        response = self.client.get(reverse('custom_admin:user_management'), {'status': 'inactive'})
+        self.assertEqual([user.username for user in response.context['users']], ['alan'])
+        self.assertEqual(
+            (response.context['total_users'], response.context['active_users'], response.context['admin_users']),
+            (5, 4, 1)
+        )
+
+
+class ProductManagementTests(AdminPanelTestCase):
+    def setUp(self):
+        super().setUp()
+        category = Category.objects.create(name='Phones', slug='phones')
+        for index, stock in enumerate([0, 5, 50, 3, 20]):
+            Product.objects.create(
+                name=f'Phone {index}', slug=f'phone-{index}', category=category, description='', price=10, stock=stock
+            )
+        Product.objects.update(created_at=timezone.now())
+
+    def test_stock_filter_pages_without_gaps(self):
+        pages = self.walk('custom_admin:product_management', 'products', stock='low')
+        self.assertEqual([[product.name for product in page] for page in pages], [['Phone 3', 'Phone 1']])
+
+        pages = self.walk('custom_admin:product_management', 'products', q='phone')
+        self.assertEqual([len(page) for page in pages], [2, 2, 1])
+        self.assertEqual(
+            [product.pk for page in pages for product in page],
+            list(Product.objects.order_by('-id').values_list('pk', flat=True))
+        )
 
-# Create your tests here.
+    def test_stats_count_every_product_whatever_the_filter(self):
+        response = self.client.get(reverse('custom_admin:product_management'), {'stock': 'out'})
+        self.assertEqual([product.name for product in response.context['products']], ['Phone 0'])
+        self.assertEqual(
+            (response.context['total_products'], response.context['available_products'],
+             response.context['low_stock_products'], response.context['out_of_stock_products']),
+            (5, 5, 2, 1)
+        )
@@ -4,40 +4,165 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 from django.db.models import Count, Sum, Q
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, datetime, time, timedelta
 from products.models import Product, Category, ProductReview
-from orders.models import Order, OrderItem
+from products.pagination import KeysetPaginator
+from orders.models import Order, OrderItem, DailySales, DailyProductSales, DailyCategorySales
 from cart.models import Cart, CartItem
 from users.models import UserProfile
 
 def is_superuser(user):
     return user.is_superuser
 
+ADMIN_PAGE_SIZE = 50
+ORDER_SORT = ('-created_at', '-id')
+USER_SORT = ('-date_joined', '-id')
+PRODUCT_SORT = ('-created_at', '-id')
+LOW_STOCK_THRESHOLD = 10
+
+def admin_page_links(request, page):
+    """First-page and next-page URLs for a keyset page, keeping the other GET filters"""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    links = {
+        'first_page_url': None if page.is_first else f'{request.path}?{params.urlencode()}',
+        'next_page_url': None,
+    }
+    if page.has_next:
+        params['cursor'] = page.next_cursor
+        links['next_page_url'] = f'{request.path}?{params.urlencode()}'
+    return links
+
+def parse_date(value):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+def local_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
+
+def search_condition(query, *fields):
+    """
+    Case-insensitive prefix match on `fields` (or the primary key for a
+    number); prefix matches can use a case-insensitive index on the column.
+    """
+    query = query.lstrip('#')
+    condition = Q()
+    for field in fields:
+        condition |= Q(**{f'{field}__istartswith': query})
+    if query.isdigit():
+        condition |= Q(pk=int(query))
+    return condition
+
+def filter_users(users, params):
+    """Apply the username/email search and status/role filters from a GET QueryDict"""
+    filters = {
+        'q': params.get('q', '').strip(),
+        'status': params.get('status', ''),
+        'role': params.get('role', ''),
+    }
+    if filters['q'].lstrip('#'):
+        users = users.filter(search_condition(filters['q'], 'username', 'email'))
+    if filters['status'] == 'active':
+        users = users.filter(is_active=True)
+    elif filters['status'] == 'inactive':
+        users = users.filter(is_active=False)
+    if filters['role'] == 'admin':
+        users = users.filter(is_superuser=True)
+    elif filters['role'] == 'customer':
+        users = users.filter(is_superuser=False)
+    return filters, users
+
+def filter_products(products, params):
+    """Apply the name search and category/status/stock filters from a GET QueryDict"""
+    category = params.get('category', '')
+    filters = {
+        'q': params.get('q', '').strip(),
+        'category': int(category) if category.isdigit() else None,
+        'status': params.get('status', ''),
+        'stock': params.get('stock', ''),
+    }
+    if filters['q'].lstrip('#'):
+        products = products.filter(search_condition(filters['q'], 'name'))
+    if filters['category']:
+        products = products.filter(category_id=filters['category'])
+    if filters['status'] == 'active':
+        products = products.filter(is_active=True)
+    elif filters['status'] == 'inactive':
+        products = products.filter(is_active=False)
+    if filters['stock'] == 'in':
+        products = products.filter(stock__gt=LOW_STOCK_THRESHOLD)
+    elif filters['stock'] == 'low':
+        products = products.filter(stock__lte=LOW_STOCK_THRESHOLD, stock__gt=0)
+    elif filters['stock'] == 'out':
+        products = products.filter(stock=0)
+    return filters, products
+
+def filter_orders(orders, params):
+    """
+    Apply the order_id search and created-date range from a GET QueryDict.
+    The status filter is returned but not applied so the caller can count
+    every status first.
+    """
+    status = params.get('status', '')
+    filters = {
+        'q': params.get('q', '').strip(),
+        'status': status if status in dict(Order.STATUS_CHOICES) else '',
+        'date_from': parse_date(params.get('date_from')),
+        'date_to': parse_date(params.get('date_to')),
+    }
+    
+    if filters['q'].lstrip('#'):
+        orders = orders.filter(search_condition(filters['q'], 'order_id'))
+    # Compare against day boundaries rather than created_at__date so the index is used
+    if filters['date_from']:
+        orders = orders.filter(created_at__gte=local_day_start(filters['date_from']))
+    if filters['date_to']:
+        orders = orders.filter(created_at__lt=local_day_start(filters['date_to'] + timedelta(days=1)))
+    return filters, orders
+
 @login_required
 @user_passes_test(is_superuser)
 def admin_dashboard(request):
-    # Get statistics for dashboard
+    # Get statistics for dashboard; sales figures come from the daily rollups
     total_users = User.objects.count()
     total_products = Product.objects.count()
-    total_orders = Order.objects.count()
-    total_revenue = Order.objects.aggregate(
-        total=Sum('total_amount')
-    )['total'] or 0
+    totals = DailySales.objects.aggregate(orders=Sum('orders'), revenue=Sum('revenue'))
+    total_orders = totals['orders'] or 0
+    total_revenue = totals['revenue'] or 0
     
     # Recent orders
     recent_orders = Order.objects.select_related('user').order_by('-created_at')[:10]
     
     # Top selling products
-    top_products = Product.objects.annotate(
-        order_count=Count('orderitem')
-    ).order_by('-order_count')[:5]
+    top_sales = list(
+        DailyProductSales.objects.values('product')
+        .annotate(order_count=Sum('order_lines'))
+        .order_by('-order_count', 'product')[:5]
+    )
+    products = Product.objects.in_bulk([row['product'] for row in top_sales])
+    top_products = []
+    for row in top_sales:
+        product = products[row['product']]
+        product.order_count = row['order_count']
+        top_products.append(product)
     
     # Monthly stats
-    current_month = timezone.now().replace(day=1)
-    monthly_orders = Order.objects.filter(created_at__gte=current_month).count()
-    monthly_revenue = Order.objects.filter(
-        created_at__gte=current_month
-    ).aggregate(total=Sum('total_amount'))['total'] or 0
+    current_month = timezone.localdate().replace(day=1)
+    monthly = DailySales.objects.filter(date__gte=current_month).aggregate(
+        orders=Sum('orders'), revenue=Sum('revenue')
+    )
+    monthly_orders = monthly['orders'] or 0
+    monthly_revenue = monthly['revenue'] or 0
+    
+    # Best-selling categories this month, by units
+    top_categories = list(
+        DailyCategorySales.objects.filter(date__gte=current_month)
+        .values('category__name')
+        .annotate(units=Sum('units'), revenue=Sum('revenue'))
+        .order_by('-units', 'category__name')[:5]
+    )
     
     context = {
         'total_users': total_users,
@@ -48,6 +173,7 @@ def admin_dashboard(request):
         'top_products': top_products,
         'monthly_orders': monthly_orders,
         'monthly_revenue': monthly_revenue,
+        'top_categories': top_categories,
     }
     
     return render(request, 'admin/dashboard.html', context)
@@ -55,8 +181,6 @@ def admin_dashboard(request):
 @login_required
 @user_passes_test(is_superuser)
 def user_management(request):
-    users = User.objects.select_related('userprofile').order_by('-date_joined')
-    
     if request.method == 'POST':
         user_id = request.POST.get('user_id')
         action = request.POST.get('action')
@@ -76,17 +200,28 @@ def user_management(request):
             user.delete()
             messages.success(request, f'User {username} has been deleted.')
             
-        return redirect('custom_admin:user_management')
+        return redirect(request.get_full_path())
     
-    context = {'users': users}
+    user_counts = User.objects.aggregate(
+        total_users=Count('pk'),
+        active_users=Count('pk', filter=Q(is_active=True)),
+        admin_users=Count('pk', filter=Q(is_superuser=True)),
+    )
+    
+    filters, users = filter_users(User.objects.all(), request.GET)
+    page = KeysetPaginator(users, USER_SORT, per_page=ADMIN_PAGE_SIZE).page(request.GET.get('cursor'))
+    
+    context = {
+        'users': page,
+        'filters': filters,
+        **user_counts,
+        **admin_page_links(request, page),
+    }
     return render(request, 'admin/user_management.html', context)
 
 @login_required
 @user_passes_test(is_superuser)
 def product_management(request):
-    products = Product.objects.select_related('category').order_by('-created_at')
-    categories = Category.objects.all()
-    
     if request.method == 'POST':
         action = request.POST.get('action')
         
@@ -145,54 +280,73 @@ def product_management(request):
             product.delete()
             messages.success(request, f'Product "{product_name}" has been deleted.')
             
-        return redirect('custom_admin:product_management')
+        return redirect(request.get_full_path())
+    
+    # Calculate statistics in a single query
+    product_counts = Product.objects.aggregate(
+        total_products=Count('pk'),
+        available_products=Count('pk', filter=Q(is_active=True)),
+        low_stock_products=Count('pk', filter=Q(stock__lte=LOW_STOCK_THRESHOLD, stock__gt=0)),
+        out_of_stock_products=Count('pk', filter=Q(stock=0)),
+    )
     
-    # Calculate statistics
-    available_products = products.filter(is_active=True).count()
-    low_stock_products = products.filter(stock__lte=10, stock__gt=0).count()
-    out_of_stock_products = products.filter(stock=0).count()
+    filters, products = filter_products(Product.objects.select_related('category'), request.GET)
+    page = KeysetPaginator(products, PRODUCT_SORT, per_page=ADMIN_PAGE_SIZE).page(request.GET.get('cursor'))
     
     context = {
-        'products': products,
-        'categories': categories,
-        'available_products': available_products,
-        'low_stock_products': low_stock_products,
-        'out_of_stock_products': out_of_stock_products,
+        'products': page,
+        'categories': Category.objects.order_by('name'),
+        'filters': filters,
+        **product_counts,
+        **admin_page_links(request, page),
     }
     return render(request, 'admin/product_management.html', context)
 
 @login_required
 @user_passes_test(is_superuser)
 def order_management(request):
-    orders = Order.objects.select_related('user').prefetch_related('items__product').order_by('-created_at')
-    
-    # Calculate order statistics
-    total_orders = orders.count()
-    pending_orders = orders.filter(status='pending').count()
-    processing_orders = orders.filter(status='processing').count()
-    shipped_orders = orders.filter(status='shipped').count()
-    delivered_orders = orders.filter(status='delivered').count()
-    cancelled_orders = orders.filter(status='cancelled').count()
-    
     if request.method == 'POST':
         order_id = request.POST.get('order_id')
         new_status = request.POST.get('status')
         
         order = get_object_or_404(Order, id=order_id)
-        order.status = new_status
-        order.save()
-        
-        messages.success(request, f'Order #{order.id} status updated to {new_status}.')
-        return redirect('custom_admin:order_management')
+        if new_status not in dict(Order.STATUS_CHOICES):
+            messages.error(request, f'Unknown order status "{new_status}".')
+        else:
+            order.status = new_status
+            order.save()
+            messages.success(request, f'Order #{order.id} status updated to {new_status}.')
+        # Stay on the same filtered page
+        return redirect(request.get_full_path())
+    
+    filters, orders = filter_orders(Order.objects.all(), request.GET)
+    
+    # Status breakdown for the current date range / search in a single query
+    status_counts = orders.aggregate(
+        total_orders=Count('pk'),
+        **{
+            f'{status}_orders': Count('pk', filter=Q(status=status))
+            for status, _ in Order.STATUS_CHOICES
+        }
+    )
+    
+    if filters['status']:
+        orders = orders.filter(status=filters['status'])
+    
+    # Only the orders on this page get their items prefetched
+    paginator = KeysetPaginator(
+        orders.select_related('user').prefetch_related('items__product'),
+        ORDER_SORT,
+        per_page=ADMIN_PAGE_SIZE
+    )
+    page = paginator.page(request.GET.get('cursor'))
     
     context = {
-        'orders': orders,
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
-        'processing_orders': processing_orders,
-        'shipped_orders': shipped_orders,
-        'delivered_orders': delivered_orders,
-        'cancelled_orders': cancelled_orders,
+        'orders': page,
+        'filters': filters,
+        'status_choices': Order.STATUS_CHOICES,
+        **status_counts,
+        **admin_page_links(request, page),
     }
     return render(request, 'admin/order_management.html', context)
 
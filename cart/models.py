@@ -32,4 +32,4 @@ class CartItem(models.Model):
     
     @property
     def total_price(self):
-        return self.product.discounted_price * self.quantity
+        return self.product.effective_price * self.quantity
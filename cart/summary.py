@@ -0,0 +1,82 @@
+"""
+Cart totals computed once per request.
+
+`Cart.total_items` / `Cart.total_price` re-read the cart lines (and each
+line's product) every time a template touches them. CartSummary loads the
+lines with their products in one query and derives every total from those
+rows; when only the totals are needed (e.g. the AJAX badge) it runs a single
+aggregate instead of loading the lines at all.
+"""
+from decimal import Decimal
+from functools import cached_property
+
+from django.db.models import DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+
+MONEY = DecimalField(max_digits=12, decimal_places=2)
+
+
+class CartSummary:
+    def __init__(self, cart):
+        self.cart = cart
+
+    @cached_property
+    def lines(self):
+        return list(self.cart.items.select_related('product__category').order_by('id'))
+
+    @cached_property
+    def totals(self):
+        if 'lines' in self.__dict__:
+            item_count = sum(line.quantity for line in self.lines)
+            subtotal = sum((line.product.effective_price * line.quantity for line in self.lines), Decimal('0'))
+            mrp_total = sum((self._reference_price(line.product) * line.quantity for line in self.lines), Decimal('0'))
+        else:
+            totals = self.cart.items.aggregate(
+                item_count=Coalesce(Sum('quantity'), 0),
+                subtotal=Coalesce(Sum(F('quantity') * F('product__effective_price'), output_field=MONEY), Decimal('0'), output_field=MONEY),
+                mrp_total=Coalesce(
+                    Sum(F('quantity') * Coalesce('product__mrp', 'product__price'), output_field=MONEY),
+                    Decimal('0'),
+                    output_field=MONEY
+                ),
+            )
+            item_count, subtotal, mrp_total = totals['item_count'], totals['subtotal'], totals['mrp_total']
+        return {
+            'item_count': item_count,
+            'subtotal': subtotal,
+            'mrp_total': mrp_total,
+            'savings': max(mrp_total - subtotal, Decimal('0')),
+        }
+
+    @staticmethod
+    def _reference_price(product):
+        return product.mrp if product.mrp is not None else product.price
+
+    @property
+    def item_count(self):
+        return self.totals['item_count']
+
+    @property
+    def subtotal(self):
+        return self.totals['subtotal']
+
+    @property
+    def mrp_total(self):
+        return self.totals['mrp_total']
+
+    @property
+    def savings(self):
+        return self.totals['savings']
+
+    @property
+    def is_empty(self):
+        return not self.lines
+
+
+def get_cart_summary(request, cart):
+    """Return the CartSummary for `cart`, memoized on the request"""
+    summary = getattr(request, '_cart_summary', None)
+    if summary is None or summary.cart.pk != cart.pk:
+        summary = CartSummary(cart)
+        request._cart_summary = summary
+    return summary
@@ -1,3 +1,36 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
 from django.test import TestCase
 
-# Create your tests here.
+from products.models import Category, Product
+from .models import Cart, CartItem
+from .summary import CartSummary
+
+
+class CartSummaryTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        phone = Product.objects.create(
+            name='Phone', slug='phone', category=category, description='', price=100, mrp=150, discount_percentage=10
+        )
+        case = Product.objects.create(name='Case', slug='case', category=category, description='', price=20)
+        self.cart = Cart.objects.create(user=User.objects.create_user('alice'))
+        CartItem.objects.create(cart=self.cart, product=phone, quantity=2)
+        CartItem.objects.create(cart=self.cart, product=case, quantity=3)
+
+    def test_aggregate_totals_in_one_query(self):
+        summary = CartSummary(self.cart)
+        with self.assertNumQueries(1):
+            totals = (summary.item_count, summary.subtotal, summary.mrp_total, summary.savings)
+        # Phone: 2 x 90 against an MRP of 150; case: 3 x 20 with no MRP
+        self.assertEqual(totals, (5, Decimal('240'), Decimal('360'), Decimal('120')))
+
+    def test_loaded_lines_give_the_same_totals_without_more_queries(self):
+        summary = CartSummary(self.cart)
+        with self.assertNumQueries(1):
+            lines = summary.lines
+            totals = (summary.item_count, summary.subtotal, summary.mrp_total, summary.savings)
+            line_totals = [line.total_price for line in lines]
+        self.assertEqual(totals, (5, Decimal('240'), Decimal('360'), Decimal('120')))
+        self.assertEqual(line_totals, [Decimal('180'), Decimal('60')])
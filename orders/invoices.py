@@ -0,0 +1,102 @@
+"""
+On-disk cache for generated invoices.
+
+An invoice only changes when its order does, so each rendered file is
+stored under INVOICE_CACHE_DIR/<order pk>/<fingerprint>.<ext>, where the
+fingerprint hashes every field the invoice shows (plus `updated_at` and
+INVOICE_VERSION). A changed order gets a new fingerprint, the stale file
+for that format is removed when the new one is written, and the fingerprint
+doubles as the response ETag so repeat downloads can be answered with 304.
+"""
+import hashlib
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+# Bump when the invoice layout changes so cached files are regenerated
+INVOICE_VERSION = 2
+
+
+def invoice_cache_root():
+    return getattr(settings, 'INVOICE_CACHE_DIR', os.path.join(settings.BASE_DIR, 'invoice_cache'))
+
+
+def invoice_cache_dir(order):
+    return os.path.join(invoice_cache_root(), str(order.pk))
+
+
+def invoice_fingerprint(order):
+    """Hash of everything rendered on the invoice for `order`"""
+    user = order.user
+    payload = {
+        'version': INVOICE_VERSION,
+        'order': [
+            order.order_id, order.status, str(order.total_amount), order.shipping_address,
+            order.phone_number, order.created_at.isoformat(), order.updated_at.isoformat(),
+        ],
+        'user': [user.username, user.first_name, user.last_name, user.email],
+        'items': [
+            [item.pk, item.product_id, item.product.name, item.product.image.name or '',
+             item.quantity, str(item.price)]
+            for item in order.items.all()
+        ],
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:32]
+
+
+def cached_invoice_path(order, extension, render, fingerprint=None):
+    """
+    Return the path of the cached invoice, calling `render(order, file)` to
+    create it first if this version of the order has not been rendered yet.
+    """
+    fingerprint = fingerprint or invoice_fingerprint(order)
+    directory = invoice_cache_dir(order)
+    path = os.path.join(directory, f'{fingerprint}.{extension}')
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(directory, exist_ok=True)
+    # Write to a temp file and rename so concurrent requests never see a partial file
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as file:
+            render(order, file)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    # Drop invoices rendered from older versions of the order
+    for name in os.listdir(directory):
+        if name.endswith(f'.{extension}') and name != os.path.basename(path):
+            try:
+                os.unlink(os.path.join(directory, name))
+            except FileNotFoundError:
+                pass
+    return path
+
+
+def invoice_response(request, order, extension, content_type, filename, render):
+    """
+    Serve the invoice from the cache with ETag / Last-Modified validators,
+    answering a matching conditional request with 304 Not Modified.
+    """
+    fingerprint = invoice_fingerprint(order)
+    etag = f'"{fingerprint}.{extension}"'
+    last_modified = order.updated_at.timestamp()
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        path = cached_invoice_path(order, extension, render, fingerprint)
+        response = FileResponse(open(path, 'rb'), as_attachment=True, filename=filename, content_type=content_type)
+
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Private, and always revalidated so a changed order is never served stale
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
@@ -0,0 +1,47 @@
+import io
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from orders.invoice_renderer import render_excel_invoice, render_pdf_invoice
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Measure the CPU time needed to render Excel and PDF invoices'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=20,
+                            help='Number of most recent orders to render')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Renders per order and format')
+
+    def handle(self, *args, **options):
+        orders = list(
+            Order.objects.select_related('user').prefetch_related('items__product')
+            .order_by('-created_at')[:options['orders']]
+        )
+        if not orders:
+            raise CommandError('There are no orders to render.')
+
+        for label, render in (('Excel', render_excel_invoice), ('PDF', render_pdf_invoice)):
+            # The first render per process builds thumbnails; keep it out of the timings
+            render(orders[0], io.BytesIO())
+
+            timings = []
+            size = 0
+            for order in orders:
+                for _ in range(options['repeat']):
+                    buffer = io.BytesIO()
+                    started = time.process_time()
+                    render(order, buffer)
+                    timings.append((time.process_time() - started) * 1000)
+                    size += buffer.tell()
+
+            self.stdout.write(
+                f'{label}: {len(timings)} renders, '
+                f'mean {statistics.mean(timings):.1f} ms, '
+                f'median {statistics.median(timings):.1f} ms, '
+                f'max {max(timings):.1f} ms CPU per invoice, '
+                f'{size / len(timings) / 1024:.0f} KB average'
+            )
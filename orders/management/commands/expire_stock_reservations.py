@@ -0,0 +1,22 @@
+import time
+
+from django.core.management.base import BaseCommand
+from orders.reservations import sweep_expired
+
+
+class Command(BaseCommand):
+    help = 'Delete expired checkout stock reservations in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of reservations deleted per statement')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, sweeping every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            removed = sweep_expired(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Removed {removed} expired stock reservations'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
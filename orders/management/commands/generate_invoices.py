@@ -0,0 +1,89 @@
+import os
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from orders.invoice_batches import INVOICE_RENDERERS, init_worker, render_batch, split_pending
+from orders.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Render invoices for a range of orders in parallel into a directory or zip archive'
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', help='Directory to write invoices to (created if missing)')
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                            help='First order date to include (YYYY-MM-DD)')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                            help='Last order date to include (YYYY-MM-DD)')
+        parser.add_argument('--status', choices=[choice for choice, _ in Order.STATUS_CHOICES],
+                            help='Only include orders with this status')
+        parser.add_argument('--format', dest='extension', choices=sorted(INVOICE_RENDERERS), default='pdf',
+                            help='Invoice format')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                            help='Number of worker processes (default: one per CPU)')
+        parser.add_argument('--batch-size', type=int, default=50,
+                            help='Orders rendered per task')
+        parser.add_argument('--zip', action='store_true',
+                            help='Also pack the invoices into <output>.zip when done')
+
+    def handle(self, *args, **options):
+        output = os.path.abspath(options['output'])
+        extension = options['extension']
+        os.makedirs(output, exist_ok=True)
+
+        orders = Order.objects.all()
+        if options['date_from']:
+            orders = orders.filter(created_at__date__gte=options['date_from'])
+        if options['date_to']:
+            orders = orders.filter(created_at__date__lte=options['date_to'])
+        if options['status']:
+            orders = orders.filter(status=options['status'])
+
+        # One read of the selection; later orders are left for the next run
+        pending, names = split_pending(orders, output, extension)
+        if names:
+            self.stdout.write(f'Skipping {len(names)} invoices already in {output}')
+
+        batch_size = max(options['batch_size'], 1)
+        batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+
+        done = 0
+        size = 0
+        started = time.monotonic()
+        if batches:
+            # Forked workers must not share the parent's database connections
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=max(options['workers'], 1), initializer=init_worker) as pool:
+                futures = [pool.submit(render_batch, batch, output, extension) for batch in batches]
+                try:
+                    for future in as_completed(futures):
+                        written, batch_bytes = future.result()
+                        names.extend(written)
+                        done += len(written)
+                        size += batch_bytes
+                        elapsed = time.monotonic() - started
+                        self.stdout.write(f'{done}/{len(pending)} invoices ({done / elapsed:.1f}/s)')
+                except Exception as e:
+                    for future in futures:
+                        future.cancel()
+                    raise CommandError(
+                        f'Rendering failed after {done} invoices: {e}. Run the command again to resume.'
+                    )
+
+        elapsed = time.monotonic() - started
+        rate = done / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f'Rendered {done} invoices ({size / 1024 / 1024:.1f} MB) in {elapsed:.1f}s, '
+            f'{rate:.1f} invoices/s with {options["workers"]} workers'
+        ))
+
+        if options['zip']:
+            archive = f'{output.rstrip(os.sep)}.zip'
+            with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for name in sorted(names):
+                    zf.write(os.path.join(output, name), arcname=name)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {len(names)} invoices to {archive}'))
@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+from orders.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily sales rollups used by the admin dashboard'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', type=date.fromisoformat,
+                            help='First day to rebuild (YYYY-MM-DD); defaults to the first order')
+        parser.add_argument('--to', dest='date_to', type=date.fromisoformat,
+                            help='Last day to rebuild (YYYY-MM-DD); defaults to today')
+
+    def handle(self, *args, **options):
+        days = rebuild_rollups(options['date_from'], options['date_to'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt sales rollups for {days} days'))
@@ -0,0 +1,23 @@
+import time
+
+from django.core.management.base import BaseCommand
+from orders.export_jobs import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = 'Generate queued order exports (CSV, Excel and PDF) off the request path'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, checking for new jobs every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            for job in run_pending_jobs():
+                if job.status == 'done':
+                    self.stdout.write(self.style.SUCCESS(f'{job}: {job.total_rows} orders written to {job.file.name}'))
+                else:
+                    self.stdout.write(self.style.ERROR(f'{job}: {job.error}'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,123 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:22
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+
+
+# A snapshot of orders.rollups.rebuild_rollups at the time of this migration
+def backfill_rollups(apps, schema_editor):
+    Order = apps.get_model('orders', 'Order')
+    OrderItem = apps.get_model('orders', 'OrderItem')
+    DailySales = apps.get_model('orders', 'DailySales')
+    DailyProductSales = apps.get_model('orders', 'DailyProductSales')
+    DailyCategorySales = apps.get_model('orders', 'DailyCategorySales')
+
+    money = DecimalField(max_digits=14, decimal_places=2)
+    zero = Value(Decimal('0'), output_field=money)
+    cancelled = Q(status='cancelled')
+    items = OrderItem.objects.annotate(
+        day=TruncDate('order__created_at'),
+        line_total=F('price') * F('quantity')
+    )
+    items_sold = dict(items.values('day').annotate(units=Sum('quantity')).order_by().values_list('day', 'units'))
+
+    DailySales.objects.bulk_create([
+        DailySales(
+            date=row['day'],
+            orders=row['orders'],
+            revenue=row['revenue'],
+            items_sold=items_sold.get(row['day'], 0),
+            cancelled_orders=row['cancelled_orders'],
+            cancelled_revenue=row['cancelled_revenue']
+        )
+        for row in Order.objects.annotate(day=TruncDate('created_at')).values('day').annotate(
+            orders=Count('pk'),
+            revenue=Coalesce(Sum('total_amount'), zero, output_field=money),
+            cancelled_orders=Count('pk', filter=cancelled),
+            cancelled_revenue=Coalesce(Sum('total_amount', filter=cancelled), zero, output_field=money),
+        ).order_by()
+    ], batch_size=1000)
+
+    DailyProductSales.objects.bulk_create([
+        DailyProductSales(
+            date=row['day'], product_id=row['product'],
+            units=row['units'], order_lines=row['order_lines'], revenue=row['revenue']
+        )
+        for row in items.values('day', 'product').annotate(
+            units=Sum('quantity'),
+            order_lines=Count('pk'),
+            revenue=Sum('line_total', output_field=money),
+        ).order_by()
+    ], batch_size=1000)
+
+    DailyCategorySales.objects.bulk_create([
+        DailyCategorySales(
+            date=row['day'], category_id=row['product__category'],
+            units=row['units'], revenue=row['revenue']
+        )
+        for row in items.values('day', 'product__category').annotate(
+            units=Sum('quantity'),
+            revenue=Sum('line_total', output_field=money),
+        ).order_by()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0004_exportjob'),
+        ('products', '0004_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('orders', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('items_sold', models.PositiveIntegerField(default=0)),
+                ('cancelled_orders', models.PositiveIntegerField(default=0)),
+                ('cancelled_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily sales',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyCategorySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.category')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily category sales',
+                'unique_together': {('date', 'category')},
+            },
+        ),
+        migrations.CreateModel(
+            name='DailyProductSales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('units', models.PositiveIntegerField(default=0)),
+                ('order_lines', models.PositiveIntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Daily product sales',
+                'unique_together': {('date', 'product')},
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
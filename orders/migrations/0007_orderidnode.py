@@ -0,0 +1,21 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_order_list_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderIdNode',
+            fields=[
+                ('node', models.PositiveSmallIntegerField(primary_key=True, serialize=False)),
+                ('owner', models.CharField(blank=True, max_length=100)),
+                ('leased_until', models.BigIntegerField(db_index=True, default=0)),
+            ],
+        ),
+    ]
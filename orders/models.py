@@ -1,6 +1,11 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
-from products.models import Product
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+from products.models import Category, Product
 
 class Order(models.Model):
     STATUS_CHOICES = [
@@ -17,15 +22,32 @@ class Order(models.Model):
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
     shipping_address = models.TextField()
     phone_number = models.CharField(max_length=15)
+    # Issued with the checkout form; a replayed submit finds this order instead
+    idempotency_key = models.CharField(max_length=64, null=True, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'idempotency_key'], name='unique_order_idempotency_key'),
+        ]
+        indexes = [
+            # Admin order list: newest first, optionally narrowed to one status
+            models.Index(fields=['-created_at', '-id'], name='order_created_idx'),
+            models.Index(fields=['status', '-created_at', '-id'], name='order_status_created_idx'),
+        ]
     
     def __str__(self):
         return f"Order {self.order_id} - {self.user.username}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status so the sales rollups can see transitions
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+    
     @property
     def total_items(self):
         return sum(item.quantity for item in self.items.all())
@@ -42,3 +64,141 @@ class OrderItem(models.Model):
     @property
     def total_price(self):
         return self.price * self.quantity
+
+
+class StockReservationQuerySet(models.QuerySet):
+    def active(self):
+        return self.filter(expires_at__gt=timezone.now())
+    
+    def expired(self):
+        return self.filter(expires_at__lte=timezone.now())
+
+class StockReservation(models.Model):
+    """A short-lived hold on stock taken when a user opens checkout"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='stock_reservations')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+    
+    objects = StockReservationQuerySet.as_manager()
+    
+    class Meta:
+        unique_together = ('user', 'product')
+        indexes = [
+            models.Index(fields=['product', 'expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} held for {self.user.username}"
+    
+    @property
+    def is_active(self):
+        return self.expires_at > timezone.now()
+
+
+class OrderIdNode(models.Model):
+    """
+    Lease on one of the 1024 order ID node numbers. Each process claims a
+    free node the first time it issues an order ID and renews the lease
+    while it keeps running (see orders.order_ids). Rows are created as nodes
+    are first claimed; times are Unix seconds.
+    """
+    node = models.PositiveSmallIntegerField(primary_key=True)
+    owner = models.CharField(max_length=100, blank=True)
+    leased_until = models.BigIntegerField(default=0, db_index=True)
+
+    def __str__(self):
+        return f"Node {self.node} ({self.owner or 'free'})"
+
+
+class DailySales(models.Model):
+    """Order totals per day, kept up to date by orders.rollups"""
+    date = models.DateField(unique=True)
+    orders = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    items_sold = models.PositiveIntegerField(default=0)
+    cancelled_orders = models.PositiveIntegerField(default=0)
+    cancelled_revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        ordering = ['-date']
+        verbose_name_plural = 'Daily sales'
+    
+    def __str__(self):
+        return f"Sales for {self.date}"
+
+class DailyProductSales(models.Model):
+    date = models.DateField()
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.PositiveIntegerField(default=0)
+    order_lines = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['date', 'product']
+        verbose_name_plural = 'Daily product sales'
+
+class DailyCategorySales(models.Model):
+    date = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='daily_sales')
+    units = models.PositiveIntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    class Meta:
+        unique_together = ['date', 'category']
+        verbose_name_plural = 'Daily category sales'
+
+def export_upload_to(instance, filename):
+    # A random directory keeps finished exports from being guessable
+    return f'exports/{uuid.uuid4().hex}/{filename}'
+
+class ExportJob(models.Model):
+    """An orders export generated by the `run_export_jobs` worker"""
+    FORMAT_CHOICES = [
+        ('csv', 'CSV'),
+        ('xlsx', 'Excel'),
+        ('pdf', 'PDF'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    
+    requested_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    export_format = models.CharField(max_length=10, choices=FORMAT_CHOICES)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    total_rows = models.PositiveIntegerField(default=0)
+    processed_rows = models.PositiveIntegerField(default=0)
+    file = models.FileField(upload_to=export_upload_to, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Moved by the worker after every chunk; a running job whose heartbeat
+    # stops was abandoned and is claimed again, up to EXPORT_JOB_MAX_ATTEMPTS
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-created_at']
+    
+    def __str__(self):
+        return f"{self.get_export_format_display()} export #{self.pk} ({self.status})"
+    
+    @property
+    def progress(self):
+        """Percentage of rows written so far"""
+        if self.status == 'done':
+            return 100
+        if not self.total_rows:
+            return 0
+        return min(100, self.processed_rows * 100 // self.total_rows)
+
+@receiver(post_delete, sender=ExportJob)
+def delete_export_file(sender, instance, **kwargs):
+    if instance.file:
+        instance.file.delete(save=False)
@@ -0,0 +1,244 @@
+"""
+Order ID generation.
+
+IDs are `FK` followed by 13 Crockford base32 characters encoding a 63-bit
+integer laid out like a snowflake ID:
+
+    41 bits  milliseconds since ORDER_ID_EPOCH
+    10 bits  node (one per worker process)
+    12 bits  per-millisecond sequence
+
+They are fixed width, so string order matches creation order and new rows
+land at the right-hand edge of the unique index, and two processes can only
+collide if they share a node number. Each process therefore leases a node
+of its own from the OrderIdNode table the first time it issues an ID and
+renews the lease every half ORDER_ID_NODE_LEASE_SECONDS; IDs are only
+issued while the lease is known to be held, so a node is never shared.
+Lease queries run on a private autocommit connection so a rolled-back
+checkout cannot undo a claim, and cost one round trip per renewal rather
+than per ID. ORDER_ID_NODE pins the node instead (the operator must then
+keep it unique per process). Swap the scheme with ORDER_ID_GENERATOR (a
+dotted path to a class with a `next_id()` method).
+"""
+import atexit
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections
+from django.utils.module_loading import import_string
+
+ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'  # Crockford base32
+ID_LENGTH = 13
+
+NODE_BITS = 10
+SEQUENCE_BITS = 12
+MAX_NODE = (1 << NODE_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+DEFAULT_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def encode_base32(number, length=ID_LENGTH):
+    chars = []
+    for _ in range(length):
+        number, remainder = divmod(number, 32)
+        chars.append(ALPHABET[remainder])
+    return ''.join(reversed(chars))
+
+
+def decode_base32(text):
+    number = 0
+    for char in text.upper():
+        number = number * 32 + ALPHABET.index(char)
+    return number
+
+
+def fixed_node():
+    """Node number pinned with ORDER_ID_NODE, or None to lease one"""
+    node = getattr(settings, 'ORDER_ID_NODE', None)
+    if node is None or node == '':
+        return None
+    node = int(node)
+    if not 0 <= node <= MAX_NODE:
+        raise ValueError(f'ORDER_ID_NODE must be between 0 and {MAX_NODE}')
+    return node
+
+
+def lease_seconds():
+    return int(getattr(settings, 'ORDER_ID_NODE_LEASE_SECONDS', 600))
+
+
+class NodeLease:
+    """A lease on one row of the OrderIdNode table, held by this process"""
+
+    def __init__(self):
+        self.owner = f'{socket.gethostname()[:60]}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self.node = None
+
+    def _execute(self, callback):
+        # A private connection: never part of the caller's transaction
+        connection = connections.create_connection(DEFAULT_DB_ALIAS)
+        try:
+            with connection.cursor() as cursor:
+                return callback(cursor)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _table():
+        from .models import OrderIdNode
+        return OrderIdNode._meta.db_table
+
+    def acquire(self):
+        """Claim a free (or expired) node, or renew the one held; returns the lease expiry"""
+        table = self._table()
+
+        def claim(cursor):
+            now = int(time.time())
+            until = now + lease_seconds()
+            if self.node is not None:
+                cursor.execute(
+                    f'UPDATE {table} SET leased_until = %s WHERE node = %s AND owner = %s AND leased_until > %s',
+                    [until, self.node, self.owner, now]
+                )
+                if cursor.rowcount == 1:
+                    return until
+                # Lease lost (the process stalled past its expiry): start over
+                self.node = None
+
+            cursor.execute(f'SELECT node FROM {table} WHERE leased_until <= %s ORDER BY leased_until, node', [now])
+            for (node,) in cursor.fetchall():
+                cursor.execute(
+                    f'UPDATE {table} SET owner = %s, leased_until = %s WHERE node = %s AND leased_until <= %s',
+                    [self.owner, until, node, now]
+                )
+                if cursor.rowcount == 1:
+                    self.node = node
+                    return until
+
+            # Node rows are created on first use
+            cursor.execute(f'SELECT node FROM {table}')
+            existing = {node for (node,) in cursor.fetchall()}
+            for node in range(MAX_NODE + 1):
+                if node in existing:
+                    continue
+                try:
+                    cursor.execute(
+                        f'INSERT INTO {table} (node, owner, leased_until) VALUES (%s, %s, %s)',
+                        [node, self.owner, until]
+                    )
+                except IntegrityError:
+                    continue
+                self.node = node
+                return until
+            raise RuntimeError('All order ID nodes are leased')
+
+        return self._execute(claim)
+
+    def release(self):
+        if self.node is None:
+            return
+        table = self._table()
+        node, self.node = self.node, None
+        try:
+            self._execute(lambda cursor: cursor.execute(
+                f'UPDATE {table} SET leased_until = 0 WHERE node = %s AND owner = %s', [node, self.owner]
+            ))
+        except Exception:
+            # Best effort at shutdown; the lease simply expires instead
+            pass
+
+
+class SnowflakeOrderIdGenerator:
+    """Monotonic, time-ordered IDs; safe to share between threads"""
+
+    prefix = 'FK'
+
+    def __init__(self, node=None, epoch=None):
+        self._fixed_node = node if node is not None else fixed_node()
+        self.epoch_ms = int((epoch or getattr(settings, 'ORDER_ID_EPOCH', DEFAULT_EPOCH)).timestamp() * 1000)
+        self._lock = threading.Lock()
+        self._pid = None
+        self._lease = None
+        self._renew_at = 0
+        self._last_ms = -1
+        self._sequence = 0
+
+    def _now_ms(self):
+        return time.time_ns() // 1_000_000 - self.epoch_ms
+
+    def _refresh_node(self):
+        # A forked worker must not keep its parent's node, lease or sequence state
+        pid = os.getpid()
+        if pid != self._pid:
+            self._pid = pid
+            self.node = self._fixed_node
+            self._lease = None
+            self._renew_at = 0
+            self._last_ms = -1
+            self._sequence = 0
+        if self._fixed_node is not None or time.time() < self._renew_at:
+            return
+        if self._lease is None:
+            self._lease = NodeLease()
+            atexit.register(self._lease.release)
+        # Renew at half-life so IDs are never issued on an expired lease
+        leased_until = self._lease.acquire()
+        self.node = self._lease.node
+        self._renew_at = leased_until - lease_seconds() / 2
+
+    def next_int(self):
+        with self._lock:
+            self._refresh_node()
+            now = self._now_ms()
+            if now < self._last_ms:
+                # Clock stepped backwards: keep counting from the last
+                # timestamp rather than reissuing old IDs
+                now = self._last_ms
+            if now == self._last_ms:
+                self._sequence = (self._sequence + 1) & MAX_SEQUENCE
+                if self._sequence == 0:
+                    # Sequence exhausted for this millisecond
+                    while now <= self._last_ms:
+                        time.sleep(0.0001)
+                        now = self._now_ms()
+            else:
+                self._sequence = 0
+            self._last_ms = now
+            return (now << (NODE_BITS + SEQUENCE_BITS)) | (self.node << SEQUENCE_BITS) | self._sequence
+
+    def next_id(self):
+        return f'{self.prefix}{encode_base32(self.next_int())}'
+
+    @classmethod
+    def parse(cls, order_id):
+        """Split an ID into (created_at, node, sequence)"""
+        number = decode_base32(order_id[len(cls.prefix):])
+        sequence = number & MAX_SEQUENCE
+        node = (number >> SEQUENCE_BITS) & MAX_NODE
+        epoch = getattr(settings, 'ORDER_ID_EPOCH', DEFAULT_EPOCH)
+        millis = (number >> (NODE_BITS + SEQUENCE_BITS)) + int(epoch.timestamp() * 1000)
+        return datetime.fromtimestamp(millis / 1000, tz=dt_timezone.utc), node, sequence
+
+
+class RandomOrderIdGenerator:
+    """The original `FK` + 8 random hex characters scheme"""
+
+    def next_id(self):
+        return f'FK{uuid.uuid4().hex[:8].upper()}'
+
+
+@lru_cache(maxsize=None)
+def get_order_id_generator():
+    path = getattr(settings, 'ORDER_ID_GENERATOR', 'orders.order_ids.SnowflakeOrderIdGenerator')
+    return import_string(path)()
+
+
+def next_order_id():
+    return get_order_id_generator().next_id()
@@ -0,0 +1,103 @@
+"""
+Time-boxed stock holds between opening checkout and placing the order.
+
+Opening checkout holds the cart quantities for STOCK_RESERVATION_MINUTES.
+Stock held by *other* users' live reservations is treated as unavailable
+by add_to_cart, checkout and the place_order decrement; a user's own holds
+are converted into the real decrement and then released. Expired rows are
+ignored everywhere and removed in batches by `expire_stock_reservations`.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from products.models import Product
+from .models import StockReservation
+
+
+def reservation_ttl():
+    return timedelta(minutes=getattr(settings, 'STOCK_RESERVATION_MINUTES', 15))
+
+
+def held_by_others(user):
+    """
+    Expression for the quantity of the outer Product held by live
+    reservations of users other than `user`.
+    """
+    reservations = StockReservation.objects.active().filter(product=OuterRef('pk'))
+    if user is not None:
+        reservations = reservations.exclude(user=user)
+    held = reservations.values('product').annotate(total=Sum('quantity')).values('total')
+    return Coalesce(Subquery(held, output_field=IntegerField()), Value(0))
+
+
+def available_stock(product_ids, user):
+    """Return {product_id: stock not held by someone else} in one query"""
+    return dict(
+        Product.objects.filter(pk__in=product_ids)
+        .annotate(available=F('stock') - held_by_others(user))
+        .values_list('pk', 'available')
+    )
+
+
+def hold_cart(user, lines):
+    """
+    Replace the user's holds with ones covering `lines` (cart items).
+    Returns the lines that could only be partly held as
+    (cart_item, available_quantity) pairs.
+
+    Availability is read and the holds written in one transaction with the
+    products locked in id order, so two checkouts racing for the last units
+    cannot both hold them. A product the user already holds keeps its
+    original expiry; refreshing checkout does not extend a hold.
+    """
+    product_ids = sorted({line.product_id for line in lines})
+    fresh_expiry = timezone.now() + reservation_ttl()
+
+    with transaction.atomic():
+        list(Product.objects.select_for_update().filter(pk__in=product_ids).order_by('pk').values_list('pk'))
+        renewed = dict(
+            StockReservation.objects.active()
+            .filter(user=user, product_id__in=product_ids)
+            .values_list('product_id', 'expires_at')
+        )
+        # Being a write, this also takes SQLite's database lock (where
+        # select_for_update is a no-op) before availability is read
+        StockReservation.objects.filter(user=user).delete()
+        available = available_stock(product_ids, user)
+
+        reservations = []
+        shortfalls = []
+        for line in lines:
+            quantity = min(line.quantity, max(available.get(line.product_id, 0), 0))
+            if quantity < line.quantity:
+                shortfalls.append((line, quantity))
+            if quantity > 0:
+                reservations.append(StockReservation(
+                    user=user, product_id=line.product_id, quantity=quantity,
+                    expires_at=renewed.get(line.product_id, fresh_expiry)
+                ))
+        StockReservation.objects.bulk_create(reservations)
+
+    return shortfalls
+
+
+def release_holds(user, product_ids=None):
+    reservations = StockReservation.objects.filter(user=user)
+    if product_ids is not None:
+        reservations = reservations.filter(product_id__in=product_ids)
+    return reservations.delete()[0]
+
+
+def sweep_expired(batch_size=1000):
+    """Delete expired reservations in primary-key batches; returns the count removed"""
+    removed = 0
+    while True:
+        batch = list(StockReservation.objects.expired().order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not batch:
+            return removed
+        removed += StockReservation.objects.filter(pk__in=batch).delete()[0]
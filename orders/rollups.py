@@ -0,0 +1,196 @@
+"""
+Daily sales rollups for the admin dashboard.
+
+DailySales, DailyProductSales and DailyCategorySales hold per-day totals so
+the dashboard never aggregates the orders tables. They are maintained
+incrementally:
+
+* `record_order` adds a new order once its checkout transaction commits
+  (so the hot row for today is never locked inside checkout); a failure
+  there is logged and leaves the order in place;
+* Order saves that move an order into or out of 'cancelled' adjust the
+  cancelled totals, and `set_order_status` does the same for bulk updates.
+
+Orders created outside checkout or deleted are not tracked; run
+`rebuild_sales_rollups` to recompute any range from the orders tables.
+"""
+import logging
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Q, Sum, Value
+from django.db.models.functions import Coalesce, TruncDate
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DailyCategorySales, DailyProductSales, DailySales, Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+MONEY = DecimalField(max_digits=14, decimal_places=2)
+
+
+def _increment(model, lookup, **increments):
+    model.objects.get_or_create(**lookup)
+    model.objects.filter(**lookup).update(**{
+        field: F(field) + value for field, value in increments.items()
+    })
+
+
+def record_order(order, items):
+    """Add a newly placed order and its items (with products loaded) to the rollups"""
+    day = timezone.localdate(order.created_at)
+    products = defaultdict(lambda: [0, 0, Decimal('0')])
+    categories = defaultdict(lambda: [0, Decimal('0')])
+    for item in items:
+        line_total = item.price * item.quantity
+        product = products[item.product_id]
+        product[0] += item.quantity
+        product[1] += 1
+        product[2] += line_total
+        category = categories[item.product.category_id]
+        category[0] += item.quantity
+        category[1] += line_total
+
+    with transaction.atomic():
+        _increment(
+            DailySales, {'date': day},
+            orders=1,
+            revenue=order.total_amount,
+            items_sold=sum(units for units, _, _ in products.values())
+        )
+        for product_id, (units, lines, revenue) in sorted(products.items()):
+            _increment(
+                DailyProductSales, {'date': day, 'product_id': product_id},
+                units=units, order_lines=lines, revenue=revenue
+            )
+        for category_id, (units, revenue) in sorted(categories.items()):
+            _increment(
+                DailyCategorySales, {'date': day, 'category_id': category_id},
+                units=units, revenue=revenue
+            )
+
+
+def record_placed_order(order, items):
+    """`record_order` for checkout's on_commit hook: the order is already committed, so only log"""
+    try:
+        record_order(order, items)
+    except Exception:
+        logger.exception(
+            'Could not add order %s to the sales rollups; run rebuild_sales_rollups for %s',
+            order.order_id, timezone.localdate(order.created_at)
+        )
+
+
+def record_cancellations(day, orders, amount):
+    """Move `orders` orders worth `amount` into (or, if negative, out of) the cancelled totals"""
+    _increment(DailySales, {'date': day}, cancelled_orders=orders, cancelled_revenue=amount)
+
+
+def set_order_status(queryset, status):
+    """`queryset.update(status=...)` that keeps the cancelled totals in step"""
+    with transaction.atomic():
+        if status == 'cancelled':
+            changing = queryset.exclude(status='cancelled')
+            sign = 1
+        else:
+            changing = queryset.filter(status='cancelled')
+            sign = -1
+        days = list(
+            changing.annotate(day=TruncDate('created_at'))
+            .values('day')
+            .annotate(count=Count('pk'), amount=Sum('total_amount'))
+            .order_by('day')
+        )
+        updated = queryset.update(status=status, updated_at=timezone.now())
+        for row in days:
+            record_cancellations(row['day'], sign * row['count'], sign * row['amount'])
+    return updated
+
+
+@receiver(post_save, sender=Order)
+def track_status_change(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created or raw or previous is None:
+        return
+    if (previous == 'cancelled') == (instance.status == 'cancelled'):
+        return
+    sign = 1 if instance.status == 'cancelled' else -1
+    record_cancellations(timezone.localdate(instance.created_at), sign, sign * instance.total_amount)
+
+
+def rebuild_rollups(date_from=None, date_to=None):
+    """
+    Recompute the rollups for orders created between `date_from` and
+    `date_to` (inclusive, either may be None); returns the number of days
+    written.
+    """
+    orders = Order.objects.annotate(day=TruncDate('created_at'))
+    items = OrderItem.objects.annotate(
+        day=TruncDate('order__created_at'),
+        line_total=F('price') * F('quantity')
+    )
+    if date_from:
+        orders = orders.filter(day__gte=date_from)
+        items = items.filter(day__gte=date_from)
+    if date_to:
+        orders = orders.filter(day__lte=date_to)
+        items = items.filter(day__lte=date_to)
+
+    zero = Value(Decimal('0'), output_field=MONEY)
+    cancelled = Q(status='cancelled')
+    items_sold = dict(items.values('day').annotate(units=Sum('quantity')).order_by().values_list('day', 'units'))
+
+    with transaction.atomic():
+        for model in (DailySales, DailyProductSales, DailyCategorySales):
+            stale = model.objects.all()
+            if date_from:
+                stale = stale.filter(date__gte=date_from)
+            if date_to:
+                stale = stale.filter(date__lte=date_to)
+            stale.delete()
+
+        days = DailySales.objects.bulk_create([
+            DailySales(
+                date=row['day'],
+                orders=row['orders'],
+                revenue=row['revenue'],
+                items_sold=items_sold.get(row['day'], 0),
+                cancelled_orders=row['cancelled_orders'],
+                cancelled_revenue=row['cancelled_revenue']
+            )
+            for row in orders.values('day').annotate(
+                orders=Count('pk'),
+                revenue=Coalesce(Sum('total_amount'), zero, output_field=MONEY),
+                cancelled_orders=Count('pk', filter=cancelled),
+                cancelled_revenue=Coalesce(Sum('total_amount', filter=cancelled), zero, output_field=MONEY),
+            ).order_by()
+        ], batch_size=1000)
+
+        DailyProductSales.objects.bulk_create([
+            DailyProductSales(
+                date=row['day'], product_id=row['product'],
+                units=row['units'], order_lines=row['order_lines'], revenue=row['revenue']
+            )
+            for row in items.values('day', 'product').annotate(
+                units=Sum('quantity'),
+                order_lines=Count('pk'),
+                revenue=Sum('line_total', output_field=MONEY),
+            ).order_by()
+        ], batch_size=1000)
+
+        DailyCategorySales.objects.bulk_create([
+            DailyCategorySales(
+                date=row['day'], category_id=row['product__category'],
+                units=row['units'], revenue=row['revenue']
+            )
+            for row in items.values('day', 'product__category').annotate(
+                units=Sum('quantity'),
+                revenue=Sum('line_total', output_field=MONEY),
+            ).order_by()
+        ], batch_size=1000)
+
+    return len(days)
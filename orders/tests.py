@@ -1,3 +1,552 @@
-from django.test import TestCase
+import io
+import os
+import re
+import shutil
+import tempfile
+import threading
+import zipfile
+from concurrent.futures import Future
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from openpyxl import load_workbook
+from PIL import Image
+
+from cart.models import Cart, CartItem
+from products.models import Category, Product
+from .checkout import commit_order, decrement_stock
+from .export_jobs import claim_next_job
+from .invoice_batches import INVOICE_RENDERERS
+from .invoice_renderer import THUMBNAIL_SIZE, product_thumbnail, render_excel_invoice, render_pdf_invoice
+from .exports import PDF_FIRST_PAGE_ROWS, PDF_ROWS_PER_PAGE, orders_csv_response, write_orders_pdf, write_orders_workbook
+from .models import DailyCategorySales, DailySales, ExportJob, Order, OrderIdNode, OrderItem, StockReservation
+from .order_ids import MAX_SEQUENCE, NODE_BITS, SEQUENCE_BITS, SnowflakeOrderIdGenerator
+from .reservations import available_stock, hold_cart, sweep_expired
+from .rollups import rebuild_rollups, set_order_status
+
+
+def cart_line(user, product, quantity):
+    cart, _ = Cart.objects.get_or_create(user=user)
+    return CartItem.objects.create(cart=cart, product=product, quantity=quantity)
+
+
+class StockReservationTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.product = Product.objects.create(
+            name='Phone', slug='phone', category=category, description='', price=100, stock=5
+        )
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def test_second_shopper_only_holds_what_is_left(self):
+        self.assertEqual(hold_cart(self.alice, [cart_line(self.alice, self.product, 4)]), [])
+
+        bob_line = cart_line(self.bob, self.product, 3)
+        self.assertEqual(hold_cart(self.bob, [bob_line]), [(bob_line, 1)])
+        self.assertEqual(StockReservation.objects.get(user=self.bob).quantity, 1)
+
+    def test_refreshing_checkout_keeps_the_original_expiry(self):
+        line = cart_line(self.alice, self.product, 2)
+        hold_cart(self.alice, [line])
+        original = timezone.now() + timedelta(minutes=3)
+        StockReservation.objects.filter(user=self.alice).update(expires_at=original)
+
+        hold_cart(self.alice, [line])
+        self.assertEqual(StockReservation.objects.get(user=self.alice).expires_at, original)
+
+    def test_expired_hold_is_replaced_with_a_fresh_one(self):
+        line = cart_line(self.alice, self.product, 2)
+        hold_cart(self.alice, [line])
+        StockReservation.objects.filter(user=self.alice).update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        hold_cart(self.alice, [line])
+        self.assertGreater(StockReservation.objects.get(user=self.alice).expires_at, timezone.now())
+
+    def test_expired_holds_free_the_stock_and_are_swept(self):
+        case = Product.objects.create(
+            name='Case', slug='case', category=self.product.category, description='', price=5, stock=5
+        )
+        hold_cart(self.alice, [cart_line(self.alice, self.product, 4), cart_line(self.alice, case, 1)])
+        self.assertEqual(available_stock([self.product.pk], self.bob), {self.product.pk: 1})
+
+        StockReservation.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(available_stock([self.product.pk], self.bob), {self.product.pk: 5})
+
+        hold_cart(self.bob, [cart_line(self.bob, case, 1)])
+        self.assertEqual(sweep_expired(batch_size=1), 2)
+        self.assertEqual(list(StockReservation.objects.values_list('user__username', flat=True)), ['bob'])
+
+    def test_decrement_skips_stock_held_by_others(self):
+        hold_cart(self.alice, [cart_line(self.alice, self.product, 4)])
+
+        bob_line = cart_line(self.bob, self.product, 2)
+        self.assertEqual(decrement_stock([bob_line], self.bob), [(bob_line, 1)])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 5)
+
+        alice_line = CartItem.objects.get(cart__user=self.alice)
+        self.assertEqual(decrement_stock([alice_line], self.alice), [])
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 1)
+
+
+@override_settings(ORDER_ID_NODE=1)
+class IdempotentCheckoutTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.product = Product.objects.create(
+            name='Phone', slug='phone', category=category, description='', price=100, stock=5
+        )
+        self.user = User.objects.create_user('alice')
+        self.client.force_login(self.user)
+
+    def place_order(self, key):
+        return self.client.post(reverse('orders:place_order'), {
+            'idempotency_key': key, 'custom_address': '1 Main St', 'phone': '9999999999'
+        })
+
+    def test_replayed_submit_returns_the_original_order(self):
+        cart_line(self.user, self.product, 2)
+        first = self.place_order('key-1')
+        order = Order.objects.get()
+        self.assertRedirects(first, reverse('orders:order_success', args=[order.pk]))
+
+        # The cart is empty by now, but the key still leads to the same order
+        replay = self.place_order('key-1')
+        self.assertRedirects(replay, reverse('orders:order_success', args=[order.pk]))
+        self.assertEqual(Order.objects.count(), 1)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.stock, 3)
+
+    def test_duplicate_key_rolls_back_the_second_commit(self):
+        commit_order(self.user, [cart_line(self.user, self.product, 1)], '', '', order_id='FK-1', idempotency_key='key-1')
+        line = CartItem.objects.get()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            commit_order(self.user, [line], '', '', order_id='FK-2', idempotency_key='key-1')
+        self.product.refresh_from_db()
+        self.assertEqual((Order.objects.count(), self.product.stock), (1, 4))
+
+
+class SalesRollupTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        self.orders = [
+            Order.objects.create(
+                user=self.user, order_id=f'FK{index}', total_amount=amount, shipping_address='', phone_number=''
+            )
+            for index, amount in enumerate([100, 250, 40])
+        ]
+        rebuild_rollups()
+
+    def sales(self):
+        return DailySales.objects.get(date=timezone.localdate())
+
+    def test_bulk_cancellation_moves_totals_once(self):
+        first_two = Order.objects.filter(pk__in=[order.pk for order in self.orders[:2]])
+        self.assertEqual(set_order_status(first_two, 'cancelled'), 2)
+        set_order_status(Order.objects.all(), 'cancelled')
+
+        sales = self.sales()
+        self.assertEqual((sales.cancelled_orders, sales.cancelled_revenue), (3, Decimal('390')))
+
+    def test_reopening_cancelled_orders_reverses_totals(self):
+        set_order_status(Order.objects.all(), 'cancelled')
+        set_order_status(Order.objects.filter(pk=self.orders[1].pk), 'confirmed')
+
+        sales = self.sales()
+        self.assertEqual((sales.cancelled_orders, sales.cancelled_revenue), (2, Decimal('140')))
+        self.assertEqual(sales.orders, 3)
+
+    def test_rollup_failure_does_not_fail_checkout(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        product = Product.objects.create(
+            name='Phone', slug='phone', category=category, description='', price=100, stock=5
+        )
+        line = cart_line(self.user, product, 1)
+
+        with mock.patch('orders.rollups.record_order', side_effect=DatabaseError), \
+                self.assertLogs('orders.rollups', 'ERROR'), \
+                self.captureOnCommitCallbacks(execute=True):
+            order = commit_order(self.user, [line], '', '', order_id='FK-new')
+        self.assertTrue(Order.objects.filter(pk=order.pk).exists())
+        self.assertEqual(self.sales().orders, 3)
+
+    def test_category_units_are_recorded_and_shown_on_the_dashboard(self):
+        phones = Category.objects.create(name='Phones', slug='phones')
+        cases = Category.objects.create(name='Cases', slug='cases')
+        lines = [
+            cart_line(self.user, Product.objects.create(
+                name=name, slug=name.lower(), category=category, description='', price=price, stock=10
+            ), quantity)
+            for name, category, price, quantity in [('Phone', phones, 100, 1), ('Case', cases, 5, 3)]
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            commit_order(self.user, lines, '', '', order_id='FK-new')
+
+        recorded = set(DailyCategorySales.objects.values_list('category__name', 'units', 'revenue'))
+        self.assertEqual(recorded, {('Phones', 1, Decimal('100')), ('Cases', 3, Decimal('15'))})
+        rebuild_rollups()
+        self.assertEqual(set(DailyCategorySales.objects.values_list('category__name', 'units', 'revenue')), recorded)
+
+        self.client.force_login(User.objects.create_superuser('admin'))
+        response = self.client.get(reverse('custom_admin:dashboard'))
+        self.assertEqual(
+            [(row['category__name'], row['units']) for row in response.context['top_categories']],
+            [('Cases', 3), ('Phones', 1)]
+        )
+
+
+@override_settings(EXPORT_JOB_STALE_SECONDS=600, EXPORT_JOB_MAX_ATTEMPTS=2)
+class ExportJobClaimTests(TestCase):
+    def running_job(self, minutes_since_heartbeat, attempts=1):
+        return ExportJob.objects.create(
+            export_format='csv', status='running', attempts=attempts,
+            heartbeat_at=timezone.now() - timedelta(minutes=minutes_since_heartbeat)
+        )
+
+    def test_live_running_job_is_left_alone(self):
+        self.running_job(1)
+        self.assertIsNone(claim_next_job())
+
+    def test_abandoned_job_is_claimed_again(self):
+        job = self.running_job(30)
+        claimed = claim_next_job()
+        self.assertEqual((claimed.pk, claimed.attempts), (job.pk, 2))
+        self.assertGreater(claimed.heartbeat_at, timezone.now() - timedelta(minutes=1))
+
+    def test_job_out_of_attempts_is_failed(self):
+        job = self.running_job(30, attempts=2)
+        pending = ExportJob.objects.create(export_format='csv')
+
+        self.assertEqual(claim_next_job().pk, pending.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+
+class ExportAllViewTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+    def test_get_only_asks_for_confirmation(self):
+        response = self.client.get(reverse('admin:orders_order_export_pdf'))
+        self.assertContains(response, 'Export all 0 orders to PDF?')
+        self.assertFalse(ExportJob.objects.exists())
+
+    def test_post_queues_the_job(self):
+        response = self.client.post(reverse('admin:orders_order_export_excel'))
+        self.assertRedirects(response, reverse('admin:orders_exportjob_changelist'))
+        self.assertEqual(list(ExportJob.objects.values_list('export_format', 'status')), [('xlsx', 'pending')])
+
+
+class OrderExportTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        phone = Product.objects.create(name='Phone', slug='phone', category=category, description='', price=100)
+        case = Product.objects.create(name='Case', slug='case', category=category, description='', price=5)
+        alice = User.objects.create_user('alice', 'alice@example.com', first_name='Alice', last_name='Smith')
+        bob = User.objects.create_user('bob', 'bob@example.com')
+        self.orders = [
+            Order.objects.create(
+                user=user, order_id=f'FK{index}', total_amount=amount,
+                shipping_address='1 Main St\nDelhi', phone_number='99'
+            )
+            for index, (user, amount) in enumerate([(alice, 115), (bob, 100), (alice, 0)])
+        ]
+        OrderItem.objects.bulk_create([
+            OrderItem(order=self.orders[0], product=phone, quantity=1, price=100),
+            OrderItem(order=self.orders[0], product=case, quantity=3, price=5),
+            OrderItem(order=self.orders[1], product=phone, quantity=1, price=100),
+        ])
+
+    def test_csv_streams_every_order_in_one_query(self):
+        response = orders_csv_response(Order.objects.all())
+        self.assertTrue(response.streaming)
+        with self.assertNumQueries(1):
+            lines = b''.join(response.streaming_content).decode().splitlines()
+
+        self.assertEqual(len(lines), 4)
+        rows = [line.split(',')[:7] for line in lines[1:]]
+        self.assertEqual(rows, [
+            ['FK2', 'Alice Smith', 'alice@example.com', '99', 'Pending', 'Rs.0.00', '0'],
+            ['FK1', 'bob', 'bob@example.com', '99', 'Pending', 'Rs.100.00', '1'],
+            ['FK0', 'Alice Smith', 'alice@example.com', '99', 'Pending', 'Rs.115.00', '4'],
+        ])
+        self.assertTrue(lines[1].endswith('1 Main St Delhi'))
+
+    def test_workbook_prefetches_items_per_chunk(self):
+        file = io.BytesIO()
+        # Totals, the orders, then one items+products query per chunk of two
+        with self.assertNumQueries(4):
+            write_orders_workbook(Order.objects.all(), file, chunk_size=2)
+
+        wb = load_workbook(file)
+        report, details = wb['Orders Report'], wb['Order Details']
+        self.assertEqual(
+            [row[:7] for row in report.iter_rows(min_row=5, values_only=True)],
+            [
+                ('FK2', 'Alice Smith', 'alice@example.com', '99', 'Pending', 'Rs.0.00', 0),
+                ('FK1', 'bob', 'bob@example.com', '99', 'Pending', 'Rs.100.00', 1),
+                ('FK0', 'Alice Smith', 'alice@example.com', '99', 'Pending', 'Rs.115.00', 4),
+            ]
+        )
+        self.assertEqual(
+            [row[:6] for row in details.iter_rows(min_row=2, values_only=True)],
+            [
+                ('FK1', 'bob', 'Phone', 1, 'Rs.100.00', 'Rs.100.00'),
+                ('FK0', 'Alice Smith', 'Phone', 1, 'Rs.100.00', 'Rs.100.00'),
+                ('FK0', 'Alice Smith', 'Case', 3, 'Rs.5.00', 'Rs.15.00'),
+            ]
+        )
+        # Rows use the shared named styles; widths come from the sampled rows
+        self.assertEqual(
+            (report['A4'].style, report['A5'].style, report['A6'].style),
+            ('export_header', 'export_data', 'export_data_alt')
+        )
+        self.assertEqual(report.column_dimensions['C'].width, len('alice@example.com') + 2)
+
+
+class InvoiceCacheTests(TestCase):
+    def setUp(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        self.enterContext(override_settings(INVOICE_CACHE_DIR=cache_dir))
+        self.cache_dir = cache_dir
+
+        category = Category.objects.create(name='Phones', slug='phones')
+        product = Product.objects.create(name='Phone', slug='phone', category=category, description='', price=100)
+        user = User.objects.create_user('alice')
+        self.order = Order.objects.create(
+            user=user, order_id='FK1', total_amount=100, shipping_address='1 Main St', phone_number='99'
+        )
+        OrderItem.objects.create(order=self.order, product=product, quantity=1, price=100)
+        self.client.force_login(user)
+        self.url = reverse('orders:download_pdf_invoice', args=[self.order.pk])
+        self.render = self.enterContext(mock.patch('orders.views.render_pdf_invoice', wraps=render_pdf_invoice))
+
+    def cached_files(self):
+        return os.listdir(os.path.join(self.cache_dir, str(self.order.pk)))
+
+    def test_repeat_downloads_reuse_the_file_and_revalidate(self):
+        first = self.client.get(self.url)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(b''.join(first.streaming_content).startswith(b'%PDF-'))
+        first.close()
+
+        second = self.client.get(self.url)
+        second.close()
+        self.assertEqual(second['ETag'], first['ETag'])
+        self.assertEqual(self.render.call_count, 1)
+
+        not_modified = self.client.get(self.url, headers={'if-none-match': first['ETag']})
+        self.assertEqual(not_modified.status_code, 304)
+        self.assertEqual(self.render.call_count, 1)
+
+    def test_changed_order_gets_a_new_invoice(self):
+        first = self.client.get(self.url)
+        first.close()
+        etag = first['ETag']
+        self.order.status = 'shipped'
+        self.order.save()
+
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        response.close()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.render.call_count, 2)
+        self.assertEqual(len(self.cached_files()), 1)
+
+
+class InvoiceRendererTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        self.enterContext(override_settings(
+            MEDIA_ROOT=media_root, INVOICE_CACHE_DIR=os.path.join(media_root, 'cache')
+        ))
+
+        category = Category.objects.create(name='Phones', slug='phones')
+        user = User.objects.create_user('alice')
+        self.order = Order.objects.create(
+            user=user, order_id='FK1', total_amount=130, shipping_address='1 Main St', phone_number='99'
+        )
+        for index in range(3):
+            product = Product.objects.create(
+                name=f'Phone {index}', slug=f'phone-{index}', category=category, description='', price=10
+            )
+            OrderItem.objects.create(order=self.order, product=product, quantity=index + 1, price=10 + index)
+
+    def test_each_workbook_gets_its_own_named_styles(self):
+        # Styles bound to the first workbook must not leak into the second
+        workbooks = []
+        for _ in range(2):
+            file = io.BytesIO()
+            with self.assertNumQueries(2):
+                render_excel_invoice(Order.objects.select_related('user').get(pk=self.order.pk), file)
+            workbooks.append(load_workbook(file))
+
+        for wb in workbooks:
+            ws = wb.active
+            self.assertIn('invoice_item_left_alt', wb.named_styles)
+            self.assertEqual(ws['A1'].style, 'invoice_title')
+            self.assertEqual(
+                [ws[f'B{row}'].style for row in (16, 17, 18)],
+                ['invoice_item_left', 'invoice_item_left_alt', 'invoice_item_left']
+            )
+            self.assertEqual(ws['B17'].fill.fgColor.rgb, '00F5F5F5')
+
+    def test_product_images_are_shrunk_to_one_cached_jpeg(self):
+        product = Product.objects.get(slug='phone-0')
+        product.image = 'products/big.png'
+        product.save()
+        os.makedirs(os.path.dirname(product.image.path))
+        Image.new('RGBA', (1200, 800), (255, 0, 0, 128)).save(product.image.path)
+
+        thumbnail = product_thumbnail(product.image)
+        self.assertEqual(product_thumbnail(product.image), thumbnail)
+        with Image.open(thumbnail) as image:
+            self.assertEqual((image.format, image.size), ('JPEG', (THUMBNAIL_SIZE[0], 80)))
+            # Half-transparent red over white
+            red, green, blue = image.getpixel((40, 40))
+            self.assertTrue(red > 240 and 110 < green < 145 and 110 < blue < 145)
+
+        file = io.BytesIO()
+        render_pdf_invoice(self.order, file)
+        self.assertTrue(file.getvalue().startswith(b'%PDF-'))
+
+
+class InlineExecutor:
+    """Stands in for the process pool: worker processes can't see the test database"""
+
+    def __init__(self, max_workers=None, initializer=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+class GenerateInvoicesTests(TestCase):
+    def setUp(self):
+        self.output = os.path.join(tempfile.mkdtemp(), 'invoices')
+        self.addCleanup(shutil.rmtree, os.path.dirname(self.output))
+        user = User.objects.create_user('alice')
+        for index in range(1, 4):
+            Order.objects.create(
+                user=user, order_id=f'FK{index}', total_amount=10, shipping_address='', phone_number=''
+            )
+        # FK3 is outside the date range
+        Order.objects.filter(order_id='FK3').update(created_at=timezone.now() - timedelta(days=30))
+
+    def test_resumed_run_zips_exactly_the_selected_invoices(self):
+        os.makedirs(self.output)
+        # Left by an interrupted run, and by an earlier run over another range
+        for name, content in (('Invoice_FK1.pdf', b'rendered before'), ('Invoice_FK3.pdf', b'other range')):
+            with open(os.path.join(self.output, name), 'wb') as file:
+                file.write(content)
+
+        def render_while_a_new_order_arrives(order, file):
+            Order.objects.create(
+                user=order.user, order_id='FK4', total_amount=10, shipping_address='', phone_number=''
+            )
+            render_pdf_invoice(order, file)
+
+        with mock.patch('orders.management.commands.generate_invoices.ProcessPoolExecutor', InlineExecutor), \
+                mock.patch.dict(INVOICE_RENDERERS, pdf=render_while_a_new_order_arrives):
+            call_command(
+                'generate_invoices', self.output, '--zip', '--batch-size', '1',
+                '--from', (timezone.localdate() - timedelta(days=1)).isoformat(), stdout=io.StringIO()
+            )
+
+        with zipfile.ZipFile(f'{self.output}.zip') as archive:
+            # FK4 came in mid-run and has no invoice, so it waits for the next run
+            self.assertEqual(archive.namelist(), ['Invoice_FK1.pdf', 'Invoice_FK2.pdf'])
+            self.assertEqual(archive.read('Invoice_FK1.pdf'), b'rendered before')
+            self.assertTrue(archive.read('Invoice_FK2.pdf').startswith(b'%PDF-'))
+        self.assertFalse([name for name in os.listdir(self.output) if name.endswith('.tmp')])
+
+
+class PdfReportTests(TestCase):
+    def test_report_is_written_page_by_page(self):
+        user = User.objects.create_user('alice')
+        Order.objects.bulk_create([
+            Order(user=user, order_id=f'FK{index}', total_amount=10, shipping_address='', phone_number='')
+            for index in range(PDF_FIRST_PAGE_ROWS + PDF_ROWS_PER_PAGE + 1)
+        ])
+        pdf = io.BytesIO()
+        write_orders_pdf(Order.objects.all(), pdf)
+
+        data = pdf.getvalue()
+        self.assertTrue(data.startswith(b'%PDF-') and data.endswith(b'%%EOF\n'))
+        self.assertEqual(len(re.findall(rb'/Type /Page\b(?!s)', data)), 3)
+        self.assertIn(b'/Count 3', data)
+
+
+class SnowflakeOrderIdTests(SimpleTestCase):
+    def test_ids_are_unique_and_ordered_across_threads(self):
+        generator = SnowflakeOrderIdGenerator(node=7)
+        issued = []
+
+        def issue():
+            ids = [generator.next_id() for _ in range(2000)]
+            self.assertEqual(ids, sorted(ids))
+            issued.extend(ids)
+
+        threads = [threading.Thread(target=issue) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(set(issued)), 8000)
+        self.assertEqual({len(order_id) for order_id in issued}, {15})
+
+    def test_clock_going_backwards_does_not_reissue_ids(self):
+        generator = SnowflakeOrderIdGenerator(node=7)
+        with mock.patch.object(generator, '_now_ms', side_effect=[1000, 1000, 900, 1001]):
+            numbers = [generator.next_int() for _ in range(4)]
+        self.assertEqual(numbers, sorted(set(numbers)))
+        self.assertEqual([number & MAX_SEQUENCE for number in numbers], [0, 1, 2, 0])
+
+    def test_exhausted_sequence_waits_for_the_next_millisecond(self):
+        generator = SnowflakeOrderIdGenerator(node=7)
+        clock = [1000] * (MAX_SEQUENCE + 2) + [1001]
+        with mock.patch.object(generator, '_now_ms', side_effect=clock), mock.patch('time.sleep'):
+            numbers = [generator.next_int() for _ in range(MAX_SEQUENCE + 2)]
+        self.assertEqual(len(set(numbers)), MAX_SEQUENCE + 2)
+        self.assertEqual(numbers[-1] >> (NODE_BITS + SEQUENCE_BITS), 1001)
+
+
+@override_settings(ORDER_ID_NODE=None)
+class OrderIdNodeLeaseTests(TransactionTestCase):
+    def test_generators_lease_distinct_nodes(self):
+        first, second = SnowflakeOrderIdGenerator(), SnowflakeOrderIdGenerator()
+        order_id = first.next_id()
+        second.next_id()
+
+        self.assertNotEqual(first.node, second.node)
+        self.assertEqual(first.parse(order_id)[1], first.node)
+        self.assertEqual(OrderIdNode.objects.filter(leased_until__gt=0).count(), 2)
+
+    def test_expired_lease_is_taken_over(self):
+        first = SnowflakeOrderIdGenerator()
+        first.next_int()
+        OrderIdNode.objects.filter(node=first.node).update(leased_until=1)
+
+        second = SnowflakeOrderIdGenerator()
+        second.next_int()
+        self.assertEqual(second.node, first.node)
+        self.assertEqual(OrderIdNode.objects.get(node=first.node).owner, second._lease.owner)
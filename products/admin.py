@@ -9,7 +9,7 @@ class CategoryAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ['name', 'category', 'price', 'stock', 'is_active', 'featured', 'created_at']
+    list_display = ['name', 'category', 'price', 'effective_price', 'stock', 'is_active', 'featured', 'created_at']
     list_filter = ['category', 'is_active', 'featured', 'created_at']
     search_fields = ['name', 'description']
     prepopulated_fields = {'slug': ('name',)}
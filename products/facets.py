@@ -0,0 +1,152 @@
+"""
+Facet counts for the product listing filters.
+
+All facets are computed by one query over active products grouped by
+category, using conditional counts. Each facet ignores its own filter
+(so picking one category still shows how many products the others have)
+but honours every other active filter. When only the category filter is
+in use the grouped rows do not depend on the request at all, so they are
+cached under a key that includes the 'facets' CacheVersion row. Changing a
+product or review bumps that row in the same transaction, so every worker
+stops using its cached copy as soon as the change commits, even though the
+default cache is per process. Saves and deletes are caught by signals;
+code that changes stock or prices with `update()` or `bulk_update()` must
+call `invalidate_facets` itself.
+"""
+from decimal import Decimal, InvalidOperation
+
+from django.core.cache import cache
+from django.db.models import Count, Q
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import CacheVersion, Product, ProductReview
+
+# (min, max) price ranges in rupees; max is exclusive, None means open ended
+PRICE_BUCKETS = [
+    (Decimal('0'), Decimal('1000')),
+    (Decimal('1000'), Decimal('5000')),
+    (Decimal('5000'), Decimal('10000')),
+    (Decimal('10000'), Decimal('25000')),
+    (Decimal('25000'), Decimal('50000')),
+    (Decimal('50000'), None),
+]
+
+RATING_BANDS = (4, 3, 2, 1)
+
+BASE_CACHE_KEY = 'products:facets:base:{version}'
+FACETS_VERSION_KEY = 'facets'
+BASE_CACHE_TIMEOUT = 300
+
+
+def _decimal(value):
+    try:
+        return Decimal(value) if value not in (None, '') else None
+    except InvalidOperation:
+        return None
+
+
+def listing_filters(params):
+    """
+    Translate listing GET parameters into one Q object per facet.
+    Missing or malformed values give an empty Q so they are simply ignored.
+    """
+    filters = {'category': Q(), 'price': Q(), 'rating': Q(), 'in_stock': Q()}
+
+    category_ids = [value for value in params.getlist('category') if value.isdigit()]
+    if category_ids:
+        filters['category'] = Q(category_id__in=category_ids)
+
+    min_price = _decimal(params.get('min_price'))
+    if min_price is not None:
+        filters['price'] &= Q(effective_price__gte=min_price)
+    max_price = _decimal(params.get('max_price'))
+    if max_price is not None:
+        filters['price'] &= Q(effective_price__lte=max_price)
+
+    rating = _decimal(params.get('rating'))
+    if rating is not None:
+        filters['rating'] = Q(average_rating__gte=rating)
+
+    if params.get('in_stock'):
+        filters['in_stock'] = Q(stock__gt=0)
+
+    return filters
+
+
+def _count(condition):
+    return Count('id', filter=condition) if condition else Count('id')
+
+
+def _grouped_counts(filters):
+    price, rating, in_stock = filters['price'], filters['rating'], filters['in_stock']
+
+    aggregates = {
+        'matching': _count(price & rating & in_stock),
+        'in_stock': _count(Q(stock__gt=0) & price & rating),
+    }
+    for index, (low, high) in enumerate(PRICE_BUCKETS):
+        bucket = Q(effective_price__gte=low)
+        if high is not None:
+            bucket &= Q(effective_price__lt=high)
+        aggregates[f'price_{index}'] = _count(bucket & rating & in_stock)
+    for band in RATING_BANDS:
+        aggregates[f'rating_{band}'] = _count(Q(average_rating__gte=band) & price & in_stock)
+
+    return list(
+        Product.objects.filter(is_active=True)
+        .values('category_id')
+        .annotate(**aggregates)
+        .order_by()
+    )
+
+
+def facet_counts(params):
+    """
+    Return facet counts for the listing filters in `params`:
+
+        {'total': int, 'categories': {category_id: count},
+         'price_buckets': [{'min', 'max', 'count'}], 'ratings': [{'rating', 'count'}],
+         'in_stock': int}
+    """
+    filters = listing_filters(params)
+
+    if filters['price'] or filters['rating'] or filters['in_stock']:
+        rows = _grouped_counts(filters)
+    else:
+        cache_key = BASE_CACHE_KEY.format(version=CacheVersion.current(FACETS_VERSION_KEY))
+        rows = cache.get(cache_key)
+        if rows is None:
+            rows = _grouped_counts(filters)
+            cache.set(cache_key, rows, BASE_CACHE_TIMEOUT)
+
+    # The category filter is applied here rather than in SQL, which keeps
+    # the grouped rows reusable across category selections
+    selected = {int(value) for value in params.getlist('category') if value.isdigit()}
+    in_selection = [row for row in rows if not selected or row['category_id'] in selected]
+
+    def total(key):
+        return sum(row[key] for row in in_selection)
+
+    return {
+        'total': total('matching'),
+        'categories': {row['category_id']: row['matching'] for row in rows},
+        'price_buckets': [
+            {'min': low, 'max': high, 'count': total(f'price_{index}')}
+            for index, (low, high) in enumerate(PRICE_BUCKETS)
+        ],
+        'ratings': [{'rating': band, 'count': total(f'rating_{band}')} for band in RATING_BANDS],
+        'in_stock': total('in_stock'),
+    }
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ProductReview)
+@receiver(post_delete, sender=ProductReview)
+def invalidate_base_facets(sender, **kwargs):
+    invalidate_facets()
+
+
+def invalidate_facets():
+    CacheVersion.bump(FACETS_VERSION_KEY)
@@ -0,0 +1,82 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, Q
+from products.facets import invalidate_facets
+from products.models import Product, ProductReview
+
+
+SUMMARY_FIELDS = ['review_count', 'rating_sum', 'average_rating'] + [f'rating_{i}_count' for i in range(1, 6)]
+
+
+class Command(BaseCommand):
+    help = 'Backfill or repair the denormalized rating summary stored on each product'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='product_ids',
+                            help='Only rebuild the given product id (can be repeated)')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Number of products updated per batch')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report drifted products without writing changes')
+
+    def handle(self, *args, **options):
+        products = Product.objects.order_by('pk')
+        if options['product_ids']:
+            products = products.filter(pk__in=options['product_ids'])
+
+        batch_size = options['batch_size']
+        checked = 0
+        repaired = 0
+        last_pk = 0
+
+        while True:
+            batch = list(products.filter(pk__gt=last_pk).only('pk', *SUMMARY_FIELDS)[:batch_size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+
+            # One grouped aggregate per batch instead of a query per product
+            rows = ProductReview.objects.filter(
+                product_id__in=[product.pk for product in batch]
+            ).values('product_id').annotate(**{
+                f'rating_{i}_count': Count('id', filter=Q(rating=i)) for i in range(1, 6)
+            })
+            histograms = {row.pop('product_id'): row for row in rows}
+
+            drifted = []
+            for product in batch:
+                summary = self.build_summary(histograms.get(product.pk, {}))
+                if any(getattr(product, field) != value for field, value in summary.items()):
+                    for field, value in summary.items():
+                        setattr(product, field, value)
+                    drifted.append(product)
+
+            checked += len(batch)
+            repaired += len(drifted)
+
+            if drifted and not options['dry_run']:
+                with transaction.atomic():
+                    Product.objects.bulk_update(drifted, SUMMARY_FIELDS)
+
+            for product in drifted:
+                self.stdout.write(f'{"Would repair" if options["dry_run"] else "Repaired"} rating summary for {product.pk}')
+
+        if repaired and not options['dry_run']:
+            # bulk_update sends no signals, and ratings feed the listing facets
+            invalidate_facets()
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Checked {checked} products, {repaired} rating summaries out of date')
+        )
+
+    @staticmethod
+    def build_summary(histogram):
+        counts = {f'rating_{i}_count': histogram.get(f'rating_{i}_count', 0) for i in range(1, 6)}
+        review_count = sum(counts.values())
+        rating_sum = sum(i * counts[f'rating_{i}_count'] for i in range(1, 6))
+        return {
+            'review_count': review_count,
+            'rating_sum': rating_sum,
+            'average_rating': rating_sum / review_count if review_count else 0,
+            **counts,
+        }
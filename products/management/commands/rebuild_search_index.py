@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from products.models import Product
+from products.search import index_products, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the product full-text search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--product', type=int, action='append', dest='product_ids',
+                            help='Only reindex the given product id (can be repeated)')
+
+    def handle(self, *args, **options):
+        backend = search_backend()
+        if backend == 'basic':
+            self.stdout.write(self.style.WARNING('This database has no full-text index; nothing to rebuild.'))
+            return
+
+        with transaction.atomic():
+            index_products(options['product_ids'])
+
+        count = len(options['product_ids']) if options['product_ids'] else Product.objects.count()
+        self.stdout.write(self.style.SUCCESS(f'Reindexed {count} products ({backend})'))
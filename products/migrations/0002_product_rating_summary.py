@@ -0,0 +1,73 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:00
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_rating_summary(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    ProductReview = apps.get_model('products', 'ProductReview')
+    rows = ProductReview.objects.values('product_id').annotate(**{
+        f'rating_{i}_count': Count('id', filter=Q(rating=i)) for i in range(1, 6)
+    })
+    for row in rows:
+        product_id = row.pop('product_id')
+        review_count = sum(row.values())
+        rating_sum = sum(i * row[f'rating_{i}_count'] for i in range(1, 6))
+        Product.objects.filter(pk=product_id).update(
+            review_count=review_count,
+            rating_sum=rating_sum,
+            average_rating=rating_sum / review_count,
+            **row
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='average_rating',
+            field=models.FloatField(db_index=True, default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_1_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_2_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_3_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_4_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_5_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='rating_sum',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_rating_summary, migrations.RunPython.noop),
+    ]
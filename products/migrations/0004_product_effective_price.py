@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:05
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Round
+
+
+def backfill_effective_price(apps, schema_editor):
+    Product = apps.get_model('products', 'Product')
+    Product.objects.update(effective_price=Case(
+        When(
+            discount_percentage__gt=0,
+            then=Round(F('price') * (100 - F('discount_percentage')) * Value(Decimal('0.01')), 2),
+        ),
+        default=F('price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0003_product_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='product',
+            name='effective_price',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, max_digits=10),
+        ),
+        migrations.RunPython(backfill_effective_price, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:25
+
+from django.db import migrations, models
+
+
+# Django's istartswith is LIKE on SQLite and UPPER(...) LIKE UPPER(...) on
+# PostgreSQL; each needs its own kind of index to avoid a table scan
+def create_name_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS product_name_search_idx "
+            "ON products_product (name COLLATE NOCASE)"
+        )
+    elif vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS product_name_search_idx "
+            "ON products_product (UPPER(name) varchar_pattern_ops)"
+        )
+
+
+def drop_name_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        schema_editor.execute("DROP INDEX IF EXISTS product_name_search_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_product_effective_price'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['is_active', '-created_at', '-id'], name='product_active_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['stock'], name='product_stock_idx'),
+        ),
+        migrations.RunPython(create_name_search_index, drop_name_search_index),
+    ]
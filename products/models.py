@@ -1,4 +1,11 @@
-from django.db import models
+from decimal import Decimal, ROUND_HALF_UP
+
+from django.db import models, transaction
+from django.db.models import Case, F, FloatField, IntegerField, Q, Value, When
+from django.db.models.functions import Cast, Round
+from django.db.models.lookups import GreaterThan
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import User
 from django.urls import reverse
 
@@ -17,6 +24,41 @@ class Category(models.Model):
     def get_absolute_url(self):
         return reverse('products:category', kwargs={'slug': self.slug})
 
+def effective_price_expression(discount_percentage=F('discount_percentage')):
+    """
+    SQL expression for the price after `discount_percentage`, rounded half up
+    like Product.compute_effective_price. It works in whole paise with integer
+    division (SQLite and PostgreSQL both truncate integer division), so the
+    database's float rounding never decides a half-paisa.
+    """
+    paise = Cast(Round(F('price') * 100), IntegerField())
+    discounted_paise = (paise * (100 - discount_percentage) + 50) / 100
+    return Case(
+        When(GreaterThan(discount_percentage, 0), then=Cast(discounted_paise, FloatField()) / 100),
+        default=F('price'),
+        output_field=models.DecimalField(max_digits=10, decimal_places=2),
+    )
+
+class ProductQuerySet(models.QuerySet):
+    def apply_discount(self, discount_percentage):
+        """Set a discount on every product in the queryset, keeping effective_price in step"""
+        # One UPDATE, so the queryset's filter is only evaluated once
+        return self._update_prices(
+            discount_percentage=discount_percentage,
+            effective_price=effective_price_expression(Value(int(discount_percentage))),
+        )
+    
+    def refresh_effective_price(self):
+        """Recompute effective_price in SQL after price/discount changes made with update()"""
+        return self._update_prices(effective_price=effective_price_expression())
+    
+    def _update_prices(self, **fields):
+        from .facets import invalidate_facets
+        with transaction.atomic():
+            updated = self.update(**fields)
+            invalidate_facets()
+        return updated
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     slug = models.SlugField(unique=True)
@@ -27,36 +69,94 @@ class Product(models.Model):
     mrp = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     discount_percentage = models.IntegerField(default=0)
     image = models.ImageField(upload_to='products/', blank=True, null=True)
+    # What the customer pays; derived from price and discount_percentage on save
+    effective_price = models.DecimalField(max_digits=10, decimal_places=2, default=0, db_index=True)
     stock = models.PositiveIntegerField(default=0)
     is_active = models.BooleanField(default=True)
     featured = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    # Denormalized rating summary, kept in sync by ProductReview
+    review_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
+    average_rating = models.FloatField(default=0, db_index=True)
+    rating_1_count = models.PositiveIntegerField(default=0)
+    rating_2_count = models.PositiveIntegerField(default=0)
+    rating_3_count = models.PositiveIntegerField(default=0)
+    rating_4_count = models.PositiveIntegerField(default=0)
+    rating_5_count = models.PositiveIntegerField(default=0)
+    
+    objects = ProductQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            # Admin product list: newest first, optionally by status or stock level.
+            # The case-insensitive name search index is created in migration 0005.
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['is_active', '-created_at', '-id'], name='product_active_created_idx'),
+            models.Index(fields=['stock'], name='product_stock_idx'),
+        ]
+    
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        self.effective_price = self.compute_effective_price()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'price', 'discount_percentage'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'effective_price'}
+        super().save(*args, **kwargs)
+    
     def get_absolute_url(self):
         return reverse('products:product_detail', kwargs={'product_id': self.id})
     
+    def compute_effective_price(self):
+        # Form and admin views may assign raw strings before saving
+        price = Decimal(str(self.price))
+        discount_percentage = int(self.discount_percentage or 0)
+        if discount_percentage > 0:
+            discount_factor = Decimal(1) - (Decimal(discount_percentage) / Decimal(100))
+            price = price * discount_factor
+        return price.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
     @property
     def discounted_price(self):
-        if self.discount_percentage > 0:
-            from decimal import Decimal
-            discount_factor = Decimal(1) - (Decimal(self.discount_percentage) / Decimal(100))
-            return self.price * discount_factor
-        return self.price
+        return self.effective_price
     
     @property
-    def average_rating(self):
-        reviews = self.reviews.all()
-        if reviews:
-            return sum([review.rating for review in reviews]) / len(reviews)
-        return 0
+    def rating_distribution(self):
+        """Return the star histogram as {rating: count}"""
+        return {i: getattr(self, f'rating_{i}_count') for i in range(1, 6)}
     
-    @property
-    def review_count(self):
-        return self.reviews.count()
+    @classmethod
+    def apply_rating_change(cls, product_id, added=None, removed=None):
+        """Adjust the rating summary of a product in a single UPDATE.
+        
+        `added` is the rating being counted in and `removed` the rating being
+        counted out, so an edited review passes both.
+        """
+        if added == removed:
+            return
+        
+        count_delta = (1 if added else 0) - (1 if removed else 0)
+        sum_delta = (added or 0) - (removed or 0)
+        
+        updates = {
+            'review_count': F('review_count') + count_delta,
+            'rating_sum': F('rating_sum') + sum_delta,
+            'average_rating': Case(
+                When(review_count__lte=-count_delta, then=Value(0.0)),
+                default=Cast(F('rating_sum') + sum_delta, FloatField()) / (F('review_count') + count_delta),
+                output_field=FloatField(),
+            ),
+        }
+        if added:
+            updates[f'rating_{added}_count'] = F(f'rating_{added}_count') + 1
+        if removed:
+            updates[f'rating_{removed}_count'] = F(f'rating_{removed}_count') - 1
+        
+        cls.objects.filter(pk=product_id).update(**updates)
 
 class ProductImage(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='images')
@@ -79,3 +179,48 @@ class ProductReview(models.Model):
     
     def __str__(self):
         return f"{self.product.name} - {self.rating} stars"
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = (
+                    ProductReview.objects.select_for_update()
+                    .filter(pk=self.pk).values_list('product_id', 'rating').first()
+                )
+            super().save(*args, **kwargs)
+            rating = int(self.rating)
+            if previous is None:
+                Product.apply_rating_change(self.product_id, added=rating)
+            elif previous[0] == self.product_id:
+                Product.apply_rating_change(self.product_id, added=rating, removed=previous[1])
+            else:
+                # Moved to another product: count it out of the old one first
+                Product.apply_rating_change(previous[0], removed=previous[1])
+                Product.apply_rating_change(self.product_id, added=rating)
+
+@receiver(post_delete, sender=ProductReview)
+def remove_review_from_rating_summary(sender, instance, **kwargs):
+    Product.apply_rating_change(instance.product_id, removed=instance.rating)
+
+class CacheVersion(models.Model):
+    """
+    Version number of a cached value shared by every process. Cache keys
+    include it, so bumping the row invalidates the value in all workers
+    even with a per-process cache (see products.facets).
+    """
+    key = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+    
+    @classmethod
+    def current(cls, key):
+        return cls.objects.filter(key=key).values_list('version', flat=True).first() or 0
+    
+    @classmethod
+    def bump(cls, key):
+        if not cls.objects.filter(key=key).update(version=F('version') + 1):
+            cls.objects.get_or_create(key=key)
+            cls.objects.filter(key=key).update(version=F('version') + 1)
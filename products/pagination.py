@@ -0,0 +1,134 @@
+"""
+Keyset (cursor) pagination for product listings.
+
+Pages are addressed by the sort values of the last row shown instead of an
+OFFSET, so fetching page N costs the same as page 1 and rows inserted while
+a shopper scrolls do not shift the pages. Every ordering ends on the primary
+key to make it total.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from decimal import Decimal
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+# Sort options exposed to shoppers, mapped to a total ordering
+PRODUCT_SORTS = {
+    'newest': ('-created_at', '-id'),
+    'price_low': ('effective_price', 'id'),
+    'price_high': ('-effective_price', '-id'),
+    'rating': ('-average_rating', '-id'),
+    'relevance': ('-search_rank', '-id'),
+}
+
+DEFAULT_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(values):
+    payload = json.dumps([_to_json(value) for value in values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor(cursor)
+    if not isinstance(values, list):
+        raise InvalidCursor(cursor)
+    return values
+
+
+def _to_json(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.cursor = cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def is_first(self):
+        return not self.cursor
+
+
+class KeysetPaginator:
+    """
+    Slice an ordered queryset into pages using an opaque cursor.
+
+    `ordering` is a sequence of field names (optionally prefixed with '-')
+    whose last element must be unique, normally the primary key.
+    """
+
+    def __init__(self, queryset, ordering, per_page=DEFAULT_PAGE_SIZE):
+        self.queryset = queryset.order_by(*ordering)
+        self.ordering = [(name.lstrip('-'), name.startswith('-')) for name in ordering]
+        self.per_page = max(1, min(int(per_page), MAX_PAGE_SIZE))
+
+    def page(self, cursor=None):
+        """Return the page after `cursor`; a bad cursor falls back to the first page"""
+        queryset = self.queryset
+        if cursor:
+            try:
+                queryset = queryset.filter(self._after(decode_cursor(cursor)))
+            except (InvalidCursor, ValidationError, TypeError):
+                cursor = None
+
+        rows = list(queryset[:self.per_page + 1])
+        next_cursor = None
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            next_cursor = encode_cursor([getattr(rows[-1], name) for name, _ in self.ordering])
+        return KeysetPage(rows, next_cursor, cursor)
+
+    def _after(self, values):
+        """
+        Build the row-value comparison (a, b, id) > (x, y, z) as nested ORs,
+        honouring the direction of each column.
+        """
+        if len(values) != len(self.ordering):
+            raise InvalidCursor(values)
+        values = [self._to_python(name, value) for (name, _), value in zip(self.ordering, values)]
+
+        condition = Q()
+        for position, (name, descending) in enumerate(self.ordering):
+            step = Q(**{f'{name}__{"lt" if descending else "gt"}': values[position]})
+            for earlier, (earlier_name, _) in enumerate(self.ordering[:position]):
+                step &= Q(**{earlier_name: values[earlier]})
+            condition |= step
+        return condition
+
+    def _to_python(self, name, value):
+        try:
+            field = self.queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            # Annotations such as the search rank are plain numbers
+            if not isinstance(value, (int, float)):
+                raise InvalidCursor(value)
+            return value
+        return field.to_python(value)
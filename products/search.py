@@ -0,0 +1,198 @@
+"""
+Full-text search index for products.
+
+SQLite uses an FTS5 virtual table keyed by the product id and ranks with
+bm25(); PostgreSQL uses a side table holding a weighted tsvector behind a GIN
+index and ranks with ts_rank_cd(). Other databases fall back to the old
+icontains scan. The index is kept in sync from Product post_save/post_delete.
+"""
+import re
+
+from django.db import connection
+from django.db.models import FloatField, Q, TextField
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Product
+
+FTS_TABLE = 'products_product_fts'
+TSVECTOR_TABLE = 'products_product_search'
+
+# Relative weight of each indexed column when ranking
+NAME_WEIGHT = 10.0
+SHORT_DESCRIPTION_WEIGHT = 5.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Control characters wrapped around matches in snippets, swapped for <mark>
+# only after the surrounding product text has been escaped
+HIGHLIGHT_START = '\x02'
+HIGHLIGHT_END = '\x03'
+
+INDEXED_FIELDS = ('name', 'short_description', 'description')
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def search_backend():
+    """Return the name of the index backend for the default database"""
+    if connection.vendor in ('sqlite', 'postgresql'):
+        return connection.vendor
+    return 'basic'
+
+
+def query_terms(query):
+    """Split free text into plain word tokens safe to embed in a match query"""
+    return TOKEN_RE.findall(query.lower())[:16]
+
+
+def index_products(product_ids=None):
+    """(Re)index the given products, or the whole catalog when no ids are given"""
+    backend = search_backend()
+    if backend == 'basic':
+        return
+
+    where = ''
+    params = []
+    if product_ids is not None:
+        product_ids = list(product_ids)
+        if not product_ids:
+            return
+        where = f"WHERE id IN ({', '.join(['%s'] * len(product_ids))})"
+        params = product_ids
+
+    with connection.cursor() as cursor:
+        if backend == 'sqlite':
+            if product_ids is not None:
+                cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(product_ids))})", params)
+            else:
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            cursor.execute(
+                f"INSERT INTO {FTS_TABLE} (rowid, name, short_description, description) "
+                f"SELECT id, name, short_description, description FROM products_product {where}",
+                params
+            )
+        else:
+            cursor.execute(
+                f"INSERT INTO {TSVECTOR_TABLE} (product_id, document) "
+                f"SELECT id, "
+                f"setweight(to_tsvector('english', name), 'A') || "
+                f"setweight(to_tsvector('english', short_description), 'B') || "
+                f"setweight(to_tsvector('english', description), 'D') "
+                f"FROM products_product {where} "
+                f"ON CONFLICT (product_id) DO UPDATE SET document = EXCLUDED.document",
+                params
+            )
+
+
+def unindex_products(product_ids):
+    backend = search_backend()
+    product_ids = list(product_ids)
+    if backend == 'basic' or not product_ids:
+        return
+    placeholders = ', '.join(['%s'] * len(product_ids))
+    with connection.cursor() as cursor:
+        if backend == 'sqlite':
+            cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({placeholders})", product_ids)
+        else:
+            cursor.execute(f"DELETE FROM {TSVECTOR_TABLE} WHERE product_id IN ({placeholders})", product_ids)
+
+
+def search_products(query, queryset=None):
+    """
+    Filter `queryset` (active products by default) down to matches for `query`.
+
+    The result is annotated with `search_rank` (higher is more relevant) and
+    `search_snippet` (raw snippet, see `highlight_snippet`) and ordered by
+    relevance. It stays a regular QuerySet so callers can filter and slice it.
+    """
+    if queryset is None:
+        queryset = Product.objects.filter(is_active=True)
+
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none()
+
+    backend = search_backend()
+
+    if backend == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # Join the FTS table once, so the MATCH runs a single time and
+        # bm25() and snippet() read the same match as the filter
+        queryset = queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = products_product.id", f"{FTS_TABLE} MATCH %s"],
+            params=[match],
+        ).annotate(
+            # bm25() is lower-is-better, so negate it
+            search_rank=RawSQL(
+                f"-bm25({FTS_TABLE}, %s, %s, %s)",
+                [NAME_WEIGHT, SHORT_DESCRIPTION_WEIGHT, DESCRIPTION_WEIGHT],
+                output_field=FloatField()
+            ),
+            search_snippet=RawSQL(
+                f"snippet({FTS_TABLE}, -1, %s, %s, '…', 16)",
+                [HIGHLIGHT_START, HIGHLIGHT_END],
+                output_field=TextField()
+            ),
+        )
+    elif backend == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        queryset = queryset.filter(
+            id__in=RawSQL(
+                f"SELECT product_id FROM {TSVECTOR_TABLE} WHERE document @@ to_tsquery('english', %s)",
+                [tsquery]
+            )
+        ).annotate(
+            search_rank=RawSQL(
+                f"SELECT ts_rank_cd(document, to_tsquery('english', %s)) FROM {TSVECTOR_TABLE} "
+                f"WHERE product_id = products_product.id",
+                [tsquery],
+                output_field=FloatField()
+            ),
+            search_snippet=RawSQL(
+                "ts_headline('english', products_product.short_description || ' ' || products_product.description, "
+                "to_tsquery('english', %s), %s)",
+                [tsquery, f'StartSel={HIGHLIGHT_START}, StopSel={HIGHLIGHT_END}, MaxWords=30, MinWords=10'],
+                output_field=TextField()
+            ),
+        )
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= (
+                Q(name__icontains=term) |
+                Q(description__icontains=term) |
+                Q(short_description__icontains=term)
+            )
+        queryset = queryset.filter(condition).annotate(
+            search_rank=RawSQL('0', [], output_field=FloatField()),
+            search_snippet=RawSQL('NULL', [], output_field=TextField()),
+        )
+
+    return queryset.order_by('-search_rank', '-created_at')
+
+
+def highlight_snippet(snippet):
+    """Escape a raw search snippet and wrap the matched terms in <mark> tags"""
+    if not snippet:
+        return ''
+    html = escape(snippet).replace(HIGHLIGHT_START, '<mark>').replace(HIGHLIGHT_END, '</mark>')
+    return mark_safe(html)
+
+
+@receiver(post_save, sender=Product)
+def update_search_index(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    # Saves that only touch stock, prices etc. leave the indexed text alone
+    if update_fields is not None and not set(update_fields) & set(INDEXED_FIELDS):
+        return
+    index_products([instance.pk])
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_products([instance.pk])
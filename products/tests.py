@@ -1,3 +1,176 @@
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.http import QueryDict
 from django.test import TestCase
+from django.urls import reverse
+
+from cart.models import Cart, CartItem
+from orders.checkout import decrement_stock
+from .facets import facet_counts
+from .models import CacheVersion, Category, Product, ProductReview
+from .pagination import PRODUCT_SORTS, KeysetPaginator
+from .search import HIGHLIGHT_START, search_products
+
+
+def rating_summary(product):
+    product.refresh_from_db()
+    return (product.review_count, product.rating_sum, product.average_rating, product.rating_distribution)
+
+
+class RatingSummaryTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        self.phone = Product.objects.create(name='Phone', slug='phone', category=category, description='', price=100)
+        self.case = Product.objects.create(name='Case', slug='case', category=category, description='', price=10)
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+
+    def test_create_and_edit(self):
+        ProductReview.objects.create(product=self.phone, user=self.alice, rating=5)
+        review = ProductReview.objects.create(product=self.phone, user=self.bob, rating=2)
+        self.assertEqual(rating_summary(self.phone), (2, 7, 3.5, {1: 0, 2: 1, 3: 0, 4: 0, 5: 1}))
+
+        review.rating = 4
+        review.save()
+        self.assertEqual(rating_summary(self.phone), (2, 9, 4.5, {1: 0, 2: 0, 3: 0, 4: 1, 5: 1}))
+
+    def test_moving_a_review_updates_both_products(self):
+        review = ProductReview.objects.create(product=self.phone, user=self.alice, rating=3)
+        review.product = self.case
+        review.save()
+
+        self.assertEqual(rating_summary(self.phone), (0, 0, 0.0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}))
+        self.assertEqual(rating_summary(self.case), (1, 3, 3.0, {1: 0, 2: 0, 3: 1, 4: 0, 5: 0}))
+
+        review.delete()
+        self.assertEqual(rating_summary(self.case), (0, 0, 0.0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}))
+
+    def test_delete(self):
+        ProductReview.objects.create(product=self.phone, user=self.alice, rating=5)
+        review = ProductReview.objects.create(product=self.phone, user=self.bob, rating=1)
+        review.delete()
+        self.assertEqual(rating_summary(self.phone), (1, 5, 5.0, {1: 0, 2: 0, 3: 0, 4: 0, 5: 1}))
+
+
+class DiscountTests(TestCase):
+    def setUp(self):
+        self.category = Category.objects.create(name='Phones', slug='phones')
+
+    def test_discount_filtered_on_itself_sets_effective_price(self):
+        product = Product.objects.create(
+            name='Phone', slug='phone', category=self.category, description='', price=1000
+        )
+        Product.objects.filter(discount_percentage=0).apply_discount(50)
+        product.refresh_from_db()
+        self.assertEqual((product.discount_percentage, product.effective_price), (50, Decimal('500.00')))
+
+    def test_sql_rounding_matches_python(self):
+        for index, (price, discount) in enumerate([('0.10', 25), ('0.30', 50), ('19.99', 15), ('1.01', 50)]):
+            Product.objects.create(
+                name='Item', slug=f'item-{index}', category=self.category, description='',
+                price=Decimal(price), discount_percentage=discount
+            )
+        Product.objects.update(effective_price=0)
+        Product.objects.refresh_effective_price()
+        for product in Product.objects.all():
+            self.assertEqual(product.effective_price, product.compute_effective_price())
+
+
+class FacetCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.category = Category.objects.create(name='Phones', slug='phones')
+        self.product = Product.objects.create(
+            name='Phone', slug='phone', category=self.category, description='', price=1200, stock=1
+        )
+        self.params = QueryDict()
+
+    def bucket_counts(self):
+        return [bucket['count'] for bucket in facet_counts(self.params)['price_buckets']]
+
+    def test_bulk_discount_refreshes_price_buckets(self):
+        self.assertEqual(self.bucket_counts()[:2], [0, 1])
+        with self.captureOnCommitCallbacks(execute=True):
+            Product.objects.filter(pk=self.product.pk).apply_discount(50)
+        self.assertEqual(self.bucket_counts()[:2], [1, 0])
+
+    def test_selling_out_refreshes_in_stock_count(self):
+        self.assertEqual(facet_counts(self.params)['in_stock'], 1)
+        user = User.objects.create_user('alice')
+        cart = Cart.objects.create(user=user)
+        line = CartItem.objects.create(cart=cart, product=self.product, quantity=1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(decrement_stock([line], user), [])
+        self.assertEqual(facet_counts(self.params)['in_stock'], 0)
+
+    def test_version_bump_from_another_process_is_seen(self):
+        self.assertEqual(facet_counts(self.params)['in_stock'], 1)
+        # What another worker does: change the rows and bump the shared
+        # version, without touching this process's cache
+        Product.objects.update(stock=0)
+        CacheVersion.objects.update_or_create(key='facets', defaults={'version': 99})
+        self.assertEqual(facet_counts(self.params)['in_stock'], 0)
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        for index in range(5):
+            Product.objects.create(
+                name=f'Phone {index}' if index % 2 else f'Gadget {index}', slug=f'item-{index}',
+                category=category, description='a phone case ' * (index + 1), price=10
+            )
+        Product.objects.create(name='Cable', slug='cable', category=category, description='usb', price=5)
+
+    def test_name_matches_rank_first_with_snippets(self):
+        results = search_products('phone')
+        self.assertEqual(str(results.query).count('MATCH'), 1)
+        self.assertEqual([product.name for product in results][:2], ['Phone 1', 'Phone 3'])
+        self.assertEqual(len(results), 5)
+        self.assertTrue(all(HIGHLIGHT_START in product.search_snippet for product in results))
+
+    def test_relevance_pages_follow_the_rank(self):
+        paginator = KeysetPaginator(search_products('phone'), PRODUCT_SORTS['relevance'], per_page=2)
+        names = []
+        page = paginator.page()
+        while True:
+            names.extend(product.name for product in page)
+            if not page.has_next:
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(names, [product.name for product in search_products('phone')])
+
+
+class ProductPaginationTests(TestCase):
+    def setUp(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        # Prices repeat so the id tie-break decides the order within a price
+        for index, price in enumerate([30, 10, 20, 10, 30, 10, 20]):
+            Product.objects.create(
+                name=f'Phone {index}', slug=f'phone-{index}', category=category, description='', price=price
+            )
+
+    def walk(self, **params):
+        """Follow next_url from the JSON endpoint until the last page"""
+        names = []
+        response = self.client.get(reverse('products:product_page'), {'per_page': 3, **params})
+        while True:
+            data = response.json()
+            names.extend(product['name'] for product in data['products'])
+            if not data['next_url']:
+                return names
+            response = self.client.get(data['next_url'])
+
+    def test_pages_cover_every_product_once_in_sort_order(self):
+        expected = list(Product.objects.order_by('effective_price', 'id').values_list('name', flat=True))
+        self.assertEqual(self.walk(sort='price_low'), expected)
+        expected = list(Product.objects.order_by('-created_at', '-id').values_list('name', flat=True))
+        self.assertEqual(self.walk(), expected)
 
-# Create your tests here.
+    def test_bad_cursor_falls_back_to_the_first_page(self):
+        response = self.client.get(reverse('products:product_page'), {'per_page': 3, 'cursor': 'not-a-cursor'})
+        first = self.client.get(reverse('products:product_page'), {'per_page': 3})
+        self.assertEqual(response.json()['products'], first.json()['products'])
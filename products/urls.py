@@ -12,4 +12,5 @@ urlpatterns = [
     path('<int:product_id>/rating-data/', views.get_product_rating, name='product_rating_data'),
     path('category/<slug:slug>/', views.category, name='category'),
     path('search/', views.search_results, name='search_results'),
+    path('page/', views.product_page, name='product_page'),
 ]
\ No newline at end of file
@@ -1,9 +1,12 @@
 from django.shortcuts import render, get_object_or_404, redirect
-from django.db.models import Q, Avg
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.http import JsonResponse
+from django.urls import reverse
 from .models import Product, Category, ProductReview
+from .search import search_products, highlight_snippet
+from .facets import facet_counts, listing_filters
+from .pagination import KeysetPaginator, PRODUCT_SORTS, DEFAULT_PAGE_SIZE
 
 def home(request):
     categories = Category.objects.all()[:8]  # Get first 8 categories
@@ -54,9 +57,61 @@ def product_detail(request, product_id):
         'user_review': user_review
     })
 
+def filter_products(products, params):
+    """Apply the shopper-facing listing filters from a GET QueryDict"""
+    for condition in listing_filters(params).values():
+        products = products.filter(condition)
+    return products
+
+def paginate_products(request, category=None, query=''):
+    """Filter, sort and cut one keyset page of active products for a listing"""
+    if query:
+        products = search_products(query)
+        default_sort = 'relevance'
+    else:
+        products = Product.objects.filter(is_active=True)
+        default_sort = 'newest'
+    
+    if category is not None:
+        products = products.filter(category=category)
+    products = filter_products(products, request.GET)
+    
+    sort_by = request.GET.get('sort', '')
+    if sort_by not in PRODUCT_SORTS or (sort_by == 'relevance' and not query):
+        sort_by = default_sort
+    
+    per_page = request.GET.get('per_page', '')
+    paginator = KeysetPaginator(
+        products,
+        PRODUCT_SORTS[sort_by],
+        per_page=int(per_page) if per_page.isdigit() else DEFAULT_PAGE_SIZE
+    )
+    return paginator.page(request.GET.get('cursor'))
+
+def page_links(request, page, category=None):
+    """Build the first-page URL and the HTML/JSON URLs for the page after `page`"""
+    params = request.GET.copy()
+    params.pop('cursor', None)
+    links = {
+        'first_page_url': None if page.is_first else f'{request.path}?{params.urlencode()}',
+        'next_page_url': None,
+        'next_page_data_url': None,
+    }
+    if not page.has_next:
+        return links
+    
+    params['cursor'] = page.next_cursor
+    data_params = params.copy()
+    if category is not None:
+        data_params['category_slug'] = category.slug
+    
+    links['next_page_url'] = f'{request.path}?{params.urlencode()}'
+    links['next_page_data_url'] = f"{reverse('products:product_page')}?{data_params.urlencode()}"
+    return links
+
 def category(request, slug):
     category = get_object_or_404(Category, slug=slug)
-    products = Product.objects.filter(category=category, is_active=True).order_by('-created_at')
+    page = paginate_products(request, category=category)
     
     # Get user's wishlist if authenticated
     user_wishlist = []
@@ -66,20 +121,22 @@ def category(request, slug):
     
     return render(request, 'products/category.html', {
         'category': category, 
-        'products': products,
-        'user_wishlist': user_wishlist
+        'products': page,
+        'page': page,
+        'user_wishlist': user_wishlist,
+        **page_links(request, page, category=category)
     })
 
 def search_results(request):
     query = request.GET.get('q', '')
-    products = []
+    page = None
+    links = {}
     if query:
-        products = Product.objects.filter(
-            Q(name__icontains=query) | 
-            Q(description__icontains=query) |
-            Q(short_description__icontains=query),
-            is_active=True
-        ).order_by('-created_at')
+        # Ranked full-text match; see products.search for the index backends
+        page = paginate_products(request, query=query)
+        for product in page:
+            product.search_highlight = highlight_snippet(product.search_snippet)
+        links = page_links(request, page)
     
     # Get user's wishlist if authenticated
     user_wishlist = []
@@ -89,13 +146,29 @@ def search_results(request):
     
     return render(request, 'products/search_results.html', {
         'query': query, 
-        'products': products,
-        'user_wishlist': user_wishlist
+        'products': page or [],
+        'page': page,
+        'user_wishlist': user_wishlist,
+        **links
     })
 
 def product_list(request):
-    products = Product.objects.filter(is_active=True)
-    categories = Category.objects.all()
+    page = paginate_products(request)
+    facets = facet_counts(request.GET)
+    categories = list(Category.objects.all())
+    for category in categories:
+        category.facet_count = facets['categories'].get(category.id, 0)
+    
+    # Quick links for the price buckets keep the other filters in place
+    for bucket in facets['price_buckets']:
+        params = request.GET.copy()
+        params.pop('cursor', None)
+        params['min_price'] = bucket['min']
+        if bucket['max'] is None:
+            params.pop('max_price', None)
+        else:
+            params['max_price'] = bucket['max']
+        bucket['url'] = f'{request.path}?{params.urlencode()}'
     
     # Get user's wishlist if authenticated
     user_wishlist = []
@@ -103,47 +176,54 @@ def product_list(request):
         from users.models import Wishlist
         user_wishlist = list(Wishlist.objects.filter(user=request.user).values_list('product_id', flat=True))
     
-    # Apply filters
-    category_filter = request.GET.getlist('category')
-    if category_filter:
-        products = products.filter(category__id__in=category_filter)
-    
-    min_price = request.GET.get('min_price')
-    if min_price:
-        products = products.filter(price__gte=min_price)
-    
-    max_price = request.GET.get('max_price')
-    if max_price:
-        products = products.filter(price__lte=max_price)
-    
-    rating_filter = request.GET.get('rating')
-    if rating_filter:
-        # Filter products with average rating >= selected rating
-        from django.db.models import Avg
-        products = products.annotate(avg_rating=Avg('reviews__rating')).filter(avg_rating__gte=rating_filter)
+    return render(request, 'products/product_list.html', {
+        'products': page,
+        'page': page,
+        'categories': categories,
+        'facets': facets,
+        'user_wishlist': user_wishlist,
+        **page_links(request, page)
+    })
+
+def product_page(request):
+    """JSON endpoint returning the next page of a listing for infinite scroll"""
+    category = None
+    category_slug = request.GET.get('category_slug')
+    if category_slug:
+        category = get_object_or_404(Category, slug=category_slug)
+    query = request.GET.get('q', '')
     
-    in_stock = request.GET.get('in_stock')
-    if in_stock:
-        products = products.filter(stock__gt=0)
+    page = paginate_products(request, category=category, query=query)
     
-    # Apply sorting
-    sort_by = request.GET.get('sort', '')
-    if sort_by == 'price_low':
-        products = products.order_by('price')
-    elif sort_by == 'price_high':
-        products = products.order_by('-price')
-    elif sort_by == 'rating':
-        from django.db.models import Avg
-        products = products.annotate(avg_rating=Avg('reviews__rating')).order_by('-avg_rating')
-    elif sort_by == 'newest':
-        products = products.order_by('-created_at')
-    else:
-        products = products.order_by('-created_at')  # default sorting
+    user_wishlist = set()
+    if request.user.is_authenticated:
+        from users.models import Wishlist
+        user_wishlist = set(Wishlist.objects.filter(
+            user=request.user, product_id__in=[product.id for product in page]
+        ).values_list('product_id', flat=True))
     
-    return render(request, 'products/product_list.html', {
-        'products': products,
-        'categories': categories,
-        'user_wishlist': user_wishlist
+    links = page_links(request, page, category=category)
+    return JsonResponse({
+        'products': [
+            {
+                'id': product.id,
+                'name': product.name,
+                'url': product.get_absolute_url(),
+                'image': product.image.url if product.image else None,
+                'price': str(product.price),
+                'discounted_price': str(product.effective_price),
+                'mrp': str(product.mrp) if product.mrp else None,
+                'discount_percentage': product.discount_percentage,
+                'average_rating': product.average_rating,
+                'review_count': product.review_count,
+                'in_stock': product.stock > 0,
+                'in_wishlist': product.id in user_wishlist,
+                'snippet': highlight_snippet(getattr(product, 'search_snippet', '')),
+            }
+            for product in page
+        ],
+        'next_cursor': page.next_cursor,
+        'next_url': links['next_page_data_url'],
     })
 
 def customer_care(request):
@@ -162,13 +242,11 @@ def product_reviews(request, product_id):
     except ProductReview.DoesNotExist:
         pass
     
-    # Calculate rating distribution
-    rating_counts = {i: 0 for i in range(1, 6)}
-    for review in reviews:
-        rating_counts[review.rating] += 1
+    # Rating distribution comes from the product's rating summary
+    rating_counts = product.rating_distribution
     
     # Calculate percentages for rating bars
-    total_reviews_count = reviews.count()
+    total_reviews_count = product.review_count
     rating_percentages = {}
     for i in range(1, 6):
         if total_reviews_count > 0:
@@ -181,7 +259,7 @@ def product_reviews(request, product_id):
         'reviews': reviews,
         'user_review': user_review,
         'rating_counts': rating_counts,
-        'total_reviews': reviews.count()
+        'total_reviews': total_reviews_count
     })
 
 @login_required
@@ -196,7 +274,8 @@ def add_review(request, product_id):
             messages.error(request, 'Please select a valid rating (1-5 stars).')
             return redirect('products:product_detail', product_id=product_id)
         
-        # Create or update review
+        # Create or update review; ProductReview.save keeps the product's
+        # rating summary in step within the same transaction
         review, created = ProductReview.objects.update_or_create(
             product=product,
             user=request.user,
@@ -250,7 +329,6 @@ def get_product_rating(request, product_id):
         'average_rating': product.average_rating,
         'review_count': product.review_count,
         'rating_distribution': {
-            str(i): ProductReview.objects.filter(product=product, rating=i).count()
-            for i in range(1, 6)
+            str(rating): count for rating, count in product.rating_distribution.items()
         }
     })
@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import UserProfile, Address, PasswordResetOTP, Wishlist, Notification, GiftCard
+from django.db import transaction
+from .models import UserProfile, Address, PasswordResetOTP, Wishlist, Notification, ArchivedNotification, GiftCard
+from .notifications import adjust_unread_counts, delete_notifications, set_read_state
 
 # Register your models here.
 
@@ -34,16 +36,43 @@ class NotificationAdmin(admin.ModelAdmin):
     readonly_fields = ['created_at', 'updated_at']
     actions = ['mark_as_read', 'mark_as_unread']
     
+    def save_model(self, request, obj, form, change):
+        with transaction.atomic():
+            super().save_model(request, obj, form, change)
+            if not change:
+                adjust_unread_counts({obj.user_id: 0 if obj.is_read else 1})
+            elif 'is_read' in form.changed_data:
+                adjust_unread_counts({obj.user_id: -1 if obj.is_read else 1})
+    
+    def delete_model(self, request, obj):
+        delete_notifications(Notification.objects.filter(pk=obj.pk))
+    
+    def delete_queryset(self, request, queryset):
+        delete_notifications(queryset)
+    
     def mark_as_read(self, request, queryset):
-        queryset.update(is_read=True)
-        self.message_user(request, f"{queryset.count()} notifications marked as read.")
+        updated = set_read_state(queryset, True)
+        self.message_user(request, f"{updated} notifications marked as read.")
     mark_as_read.short_description = "Mark selected notifications as read"
     
     def mark_as_unread(self, request, queryset):
-        queryset.update(is_read=False)
-        self.message_user(request, f"{queryset.count()} notifications marked as unread.")
+        updated = set_read_state(queryset, False)
+        self.message_user(request, f"{updated} notifications marked as unread.")
     mark_as_unread.short_description = "Mark selected notifications as unread"
 
+@admin.register(ArchivedNotification)
+class ArchivedNotificationAdmin(admin.ModelAdmin):
+    list_display = ['user', 'title', 'notification_type', 'created_at', 'archived_at']
+    search_fields = ['user__username', 'title']
+    list_filter = ['notification_type']
+    raw_id_fields = ['user']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(GiftCard)
 class GiftCardAdmin(admin.ModelAdmin):
     list_display = ['card_number', 'recipient_name', 'amount', 'remaining_balance', 'status', 'created_at', 'is_delivered']
@@ -0,0 +1,94 @@
+"""
+Bulk notification dispatch.
+
+`dispatch_notifications` takes any number of (user, template, context)
+messages and writes them with batched INSERTs inside one transaction,
+updating each user's unread counter once at the end. `broadcast` sends one
+template to a whole segment of users (a User queryset, e.g.
+`wishlist_segment(product)`), streaming the ids from the database.
+
+Templates are `str.format` strings filled from the message context. The
+context keys `order_id` and `product_id` also fill the notification's link
+fields.
+"""
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import Notification
+from .notifications import adjust_unread_counts
+
+DISPATCH_BATCH_SIZE = 1000
+
+NOTIFICATION_TEMPLATES = {
+    'order_shipped': {
+        'notification_type': 'order_shipped',
+        'title': 'Order Shipped',
+        'message': 'Your order {order_number} has been shipped and is on its way!',
+        'action_url': '/orders/{order_id}/',
+    },
+    'order_delivered': {
+        'notification_type': 'order_delivered',
+        'title': 'Order Delivered',
+        'message': 'Your order {order_number} has been delivered successfully!',
+        'action_url': '/orders/{order_id}/',
+    },
+    'product_back_in_stock': {
+        'notification_type': 'product_back_in_stock',
+        'title': 'Back in Stock',
+        'message': '{product_name} from your wishlist is back in stock.',
+        'action_url': '/products/{product_id}/',
+    },
+}
+
+
+def render_notification(user_id, template, context):
+    template = NOTIFICATION_TEMPLATES[template]
+    return Notification(
+        user_id=user_id,
+        notification_type=template['notification_type'],
+        title=template['title'].format(**context),
+        message=template['message'].format(**context),
+        action_url=template['action_url'].format(**context) if template.get('action_url') else None,
+        order_id=context.get('order_id'),
+        product_id=context.get('product_id'),
+    )
+
+
+def dispatch_notifications(messages, batch_size=DISPATCH_BATCH_SIZE):
+    """
+    Create a notification for every (user or user id, template name,
+    context) in `messages`; returns the number created.
+    """
+    unread = Counter()
+    batch = []
+    with transaction.atomic():
+        for user, template, context in messages:
+            user_id = getattr(user, 'pk', user)
+            batch.append(render_notification(user_id, template, context))
+            unread[user_id] += 1
+            if len(batch) >= batch_size:
+                Notification.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Notification.objects.bulk_create(batch)
+        adjust_unread_counts(unread)
+    return sum(unread.values())
+
+
+def broadcast(users, template, context, batch_size=DISPATCH_BATCH_SIZE):
+    """Send the same notification to every user in the `users` queryset"""
+    user_ids = users.order_by().values_list('pk', flat=True).distinct().iterator(chunk_size=batch_size)
+    return dispatch_notifications(((user_id, template, context) for user_id in user_ids), batch_size)
+
+
+def order_messages(orders, template):
+    """One `template` message per order in `orders`, addressed to its customer"""
+    for pk, order_number, user_id in orders.values_list('pk', 'order_id', 'user_id').iterator():
+        yield user_id, template, {'order_id': pk, 'order_number': order_number}
+
+
+def wishlist_segment(product):
+    """Active users with `product` in their wishlist"""
+    return User.objects.filter(is_active=True, wishlist_items__product=product)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+from users.retention import DEFAULT_BATCH_SIZE, RETENTION_POLICIES, expire_notifications
+
+
+class Command(BaseCommand):
+    help = 'Archive or delete read notifications older than the retention period, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help='Retention period in days (default NOTIFICATION_RETENTION_DAYS)')
+        parser.add_argument('--policy', choices=RETENTION_POLICIES,
+                            help='archive or delete (default NOTIFICATION_RETENTION_POLICY)')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help='Notifications moved per transaction')
+        parser.add_argument('--limit', type=int,
+                            help='Stop after this many notifications')
+        parser.add_argument('--interval', type=int, default=0,
+                            help='Keep running, sweeping every N seconds')
+
+    def handle(self, *args, **options):
+        while True:
+            expired = expire_notifications(
+                days=options['days'],
+                policy=options['policy'],
+                batch_size=options['batch_size'],
+                limit=options['limit']
+            )
+            self.stdout.write(self.style.SUCCESS(f'Expired {expired} read notifications'))
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,42 @@
+from django.db import migrations
+
+
+# auth_user belongs to django.contrib.auth, so the indexes the admin user
+# list needs are created here with SQL rather than through Meta.indexes.
+# Django's istartswith is LIKE on SQLite and UPPER(...) LIKE UPPER(...) on
+# PostgreSQL; each needs its own kind of index to avoid a table scan.
+def create_user_indexes(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        search_column = '{} COLLATE NOCASE'
+    elif vendor == 'postgresql':
+        search_column = 'UPPER({}) varchar_pattern_ops'
+    else:
+        return
+    for column in ('username', 'email'):
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS auth_user_{column}_search_idx "
+            f"ON auth_user ({search_column.format(column)})"
+        )
+    schema_editor.execute(
+        "CREATE INDEX IF NOT EXISTS auth_user_joined_idx ON auth_user (date_joined, id)"
+    )
+
+
+def drop_user_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor not in ('sqlite', 'postgresql'):
+        return
+    for name in ('auth_user_username_search_idx', 'auth_user_email_search_idx', 'auth_user_joined_idx'):
+        schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0005_giftcard'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_user_indexes, drop_user_indexes),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.1.15 on 2026-10-17 00:31
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+# Every counter starts at zero, so only users with unread notifications
+# need a row written
+def backfill_unread_counts(apps, schema_editor):
+    Notification = apps.get_model('users', 'Notification')
+    NotificationState = apps.get_model('users', 'NotificationState')
+
+    counts = dict(
+        Notification.objects.filter(is_read=False)
+        .values('user').annotate(count=Count('pk')).order_by()
+        .values_list('user', 'count')
+    )
+    user_ids = sorted(counts)
+    for start in range(0, len(user_ids), 500):
+        chunk = user_ids[start:start + 500]
+        NotificationState.objects.bulk_create(
+            [NotificationState(user_id=user_id) for user_id in chunk], ignore_conflicts=True
+        )
+        states = list(NotificationState.objects.filter(user_id__in=chunk))
+        for state in states:
+            state.unread_count = counts[state.user_id]
+        NotificationState.objects.bulk_update(states, ['unread_count'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_notificationstate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notificationstate',
+            name='unread_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_unread_counts, migrations.RunPython.noop),
+    ]
@@ -108,13 +108,21 @@ class Notification(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Notifications'
+        indexes = [
+            # Header feed (latest first) and the unread count
+            models.Index(fields=['user', '-created_at', '-id'], name='notification_feed_idx'),
+            models.Index(fields=['user', 'is_read'], name='notification_unread_idx'),
+            # Retention sweep: only read notifications are ever archived
+            models.Index(fields=['created_at'], condition=models.Q(is_read=True), name='notification_read_created_idx'),
+        ]
     
     def __str__(self):
         return f"{self.user.username} - {self.title}"
     
     def mark_as_read(self):
+        from .notifications import set_read_state
+        set_read_state(Notification.objects.filter(pk=self.pk), True)
         self.is_read = True
-        self.save()
     
     def get_icon_class(self):
         """Return appropriate icon class based on notification type"""
@@ -131,6 +139,46 @@ class Notification(models.Model):
         }
         return icon_map.get(self.notification_type, 'fas fa-bell text-secondary')
 
+class NotificationState(models.Model):
+    """
+    Per-user notification counters: the number of unread notifications and
+    a change counter bumped whenever they are created or change read state,
+    so the badge and the unread-count stream read one row instead of
+    counting notifications. Maintained by users.notifications.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='notification_state')
+    unread_count = models.PositiveIntegerField(default=0)
+    version = models.PositiveBigIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.unread_count} unread (v{self.version})"
+
+class ArchivedNotification(models.Model):
+    """
+    Read notifications moved out of the live table by the retention sweep
+    (users.retention). Keeps the original id and only what is needed to
+    show the notification again.
+    """
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_notifications', db_index=False)
+    title = models.CharField(max_length=200)
+    message = models.TextField()
+    notification_type = models.CharField(max_length=30, choices=Notification.NOTIFICATION_TYPES, default='general')
+    order_id = models.IntegerField(blank=True, null=True)
+    product_id = models.IntegerField(blank=True, null=True)
+    action_url = models.URLField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-id'], name='archived_notification_user_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} - {self.title}"
+
 class GiftCard(models.Model):
     GIFT_CARD_STATUS = [
         ('active', 'Active'),
@@ -0,0 +1,342 @@
+"""
+Notification feed, unread counters and change tracking.
+
+Each user's NotificationState row holds a denormalized `unread_count` and
+a `version` that moves on every change, so the badge is a primary-key
+lookup. The unread-count streams (`unread_count_events`) share one
+`UnreadCountWatcher` per process, which reads the rows of every connected
+user with a single query per STREAM_POLL_INTERVAL and wakes only the
+streams whose version moved; streams never touch the database themselves. Code that creates notifications calls `adjust_unread_counts` (see
+`users.views.create_notification`); read-state changes and deletes go
+through `set_read_state` and `delete_notifications`. Anything else that
+touches `is_read` directly leaves the counters stale until
+`reconcile_unread_counts` (the reconcile_notification_counts command) runs.
+
+`notification_feed` returns the latest notifications for a user together
+with their unread count in one query against the (user, created_at, id)
+index. Older entries are reached with an opaque keyset `cursor`; `since`
+limits the feed to notifications newer than a given id.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import weakref
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Count, F, IntegerField, Subquery
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from products.pagination import KeysetPaginator
+
+from .models import Notification, NotificationState
+
+FEED_SORT = ('-created_at', '-id')
+DEFAULT_FEED_SIZE = 5
+MAX_FEED_SIZE = 50
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks of the change counters / keep-alive comments, and
+# how long one stream stays open before the browser is asked to reconnect
+STREAM_POLL_INTERVAL = getattr(settings, 'NOTIFICATION_STREAM_POLL_INTERVAL', 2)
+STREAM_KEEPALIVE = 15
+STREAM_MAX_AGE = getattr(settings, 'NOTIFICATION_STREAM_MAX_AGE', 300)
+
+# Users per counter UPDATE, to stay well inside database parameter limits
+STATE_BATCH_SIZE = 500
+
+
+def unread_count_subquery(user):
+    return Subquery(
+        NotificationState.objects.filter(user=user).values('unread_count')[:1],
+        output_field=IntegerField()
+    )
+
+
+def serialize_notification(notification):
+    return {
+        'id': notification.pk,
+        'title': notification.title,
+        'message': notification.message,
+        'type': notification.notification_type,
+        'icon': notification.get_icon_class(),
+        'is_read': notification.is_read,
+        'action_url': notification.action_url,
+        'created_at': notification.created_at.isoformat(),
+    }
+
+
+def notification_feed(user, limit=DEFAULT_FEED_SIZE, cursor=None, since=None):
+    """Build the JSON-ready feed for `user` (see the module docstring)"""
+    limit = max(1, min(limit, MAX_FEED_SIZE))
+    notifications = Notification.objects.filter(user=user).annotate(
+        unread=unread_count_subquery(user)
+    )
+    if since is not None:
+        notifications = notifications.filter(pk__gt=since)
+
+    page = KeysetPaginator(notifications, FEED_SORT, per_page=limit).page(cursor)
+    if page.object_list:
+        unread_count = page.object_list[0].unread or 0
+    else:
+        # Nothing new on this page, but there may still be older unread ones
+        unread_count = unread_notification_count(user.pk)
+
+    return {
+        'unread_count': unread_count,
+        'notifications': [serialize_notification(notification) for notification in page],
+        'next_cursor': page.next_cursor,
+    }
+
+
+def feed_etag(feed):
+    payload = json.dumps(feed, sort_keys=True, separators=(',', ':'))
+    return '"%s"' % hashlib.sha256(payload.encode()).hexdigest()[:32]
+
+
+def chunked(items, size=STATE_BATCH_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def ensure_notification_states(user_ids):
+    for chunk in chunked(set(user_ids)):
+        existing = set(
+            NotificationState.objects.filter(user_id__in=chunk).values_list('user_id', flat=True)
+        )
+        NotificationState.objects.bulk_create(
+            [NotificationState(user_id=user_id) for user_id in chunk if user_id not in existing],
+            ignore_conflicts=True
+        )
+
+
+def adjust_unread_counts(deltas):
+    """Add `{user_id: change}` to the users' unread counters and bump their versions"""
+    by_delta = defaultdict(list)
+    for user_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(user_id)
+    if not by_delta:
+        return
+    with transaction.atomic():
+        ensure_notification_states([user_id for user_ids in by_delta.values() for user_id in user_ids])
+        for delta, user_ids in sorted(by_delta.items()):
+            for chunk in chunked(sorted(user_ids)):
+                NotificationState.objects.filter(user_id__in=chunk).update(
+                    unread_count=Greatest(F('unread_count') + delta, 0),
+                    version=F('version') + 1
+                )
+
+
+def set_read_state(notifications, is_read):
+    """
+    `notifications.update(is_read=...)` that keeps the unread counters in
+    step; returns the number of notifications that changed state.
+    """
+    changed = 0
+    with transaction.atomic():
+        deltas = {}
+        for user_id in notifications.values_list('user_id', flat=True).distinct().order_by():
+            count = notifications.filter(user_id=user_id, is_read=not is_read).update(
+                is_read=is_read, updated_at=timezone.now()
+            )
+            deltas[user_id] = -count if is_read else count
+            changed += count
+        adjust_unread_counts(deltas)
+    return changed
+
+
+def delete_notifications(notifications):
+    """`notifications.delete()` that keeps the unread counters in step"""
+    with transaction.atomic():
+        deltas = {
+            row['user']: -row['count']
+            for row in notifications.filter(is_read=False).values('user').annotate(count=Count('pk')).order_by()
+        }
+        deleted, _ = notifications.delete()
+        adjust_unread_counts(deltas)
+    return deleted
+
+
+def unread_notification_count(user_id):
+    count = NotificationState.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+    return count or 0
+
+
+def reconcile_unread_counts(batch_size=1000):
+    """
+    Recount unread notifications for every user and correct counters that
+    have drifted; returns the number corrected.
+    """
+    corrected = 0
+    last_id = 0
+    while True:
+        user_ids = list(
+            User.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not user_ids:
+            return corrected
+        last_id = user_ids[-1]
+
+        with transaction.atomic():
+            stored = dict(
+                NotificationState.objects.select_for_update()
+                .filter(user_id__in=user_ids)
+                .values_list('user_id', 'unread_count')
+            )
+            actual = dict(
+                Notification.objects.filter(user_id__in=user_ids, is_read=False)
+                .values('user').annotate(count=Count('pk')).order_by()
+                .values_list('user', 'count')
+            )
+            drifted = defaultdict(list)
+            for user_id in user_ids:
+                if stored.get(user_id, 0) != actual.get(user_id, 0):
+                    drifted[actual.get(user_id, 0)].append(user_id)
+            if not drifted:
+                continue
+
+            NotificationState.objects.bulk_create(
+                [
+                    NotificationState(user_id=user_id)
+                    for user_ids in drifted.values() for user_id in user_ids if user_id not in stored
+                ],
+                ignore_conflicts=True
+            )
+            for count, user_ids in drifted.items():
+                NotificationState.objects.filter(user_id__in=user_ids).update(
+                    unread_count=count, version=F('version') + 1
+                )
+                corrected += len(user_ids)
+
+
+def fetch_notification_states(user_ids):
+    """`{user_id: (version, unread_count)}` for `user_ids`, on a short-lived connection"""
+    try:
+        states = {}
+        for chunk in chunked(user_ids):
+            for user_id, version, count in NotificationState.objects.filter(user_id__in=chunk).values_list(
+                'user_id', 'version', 'unread_count'
+            ):
+                states[user_id] = (version, count)
+        return states
+    finally:
+        # Runs on an executor thread; don't leave a connection parked on it
+        connection.close()
+
+
+class Subscription:
+    def __init__(self):
+        self.state = None
+        self.changed = asyncio.Event()
+
+    def update(self, state):
+        if state != self.state:
+            self.state = state
+            self.changed.set()
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.changed.clear()
+
+
+class UnreadCountWatcher:
+    """
+    Polls NotificationState for every user with an open stream in this
+    event loop, one batched query per interval, and only while there are
+    subscribers.
+    """
+
+    def __init__(self):
+        self.subscriptions = defaultdict(set)
+        self.wake = asyncio.Event()
+        self.task = None
+
+    def subscribe(self, user_id):
+        subscription = Subscription()
+        self.subscriptions[user_id].add(subscription)
+        # New subscribers get their first state without waiting a full interval
+        self.wake.set()
+        if self.task is None:
+            self.task = asyncio.get_running_loop().create_task(self.run())
+        return subscription
+
+    def unsubscribe(self, user_id, subscription):
+        subscriptions = self.subscriptions.get(user_id)
+        if subscriptions is not None:
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self.subscriptions[user_id]
+
+    async def poll(self):
+        user_ids = list(self.subscriptions)
+        try:
+            states = await sync_to_async(fetch_notification_states, thread_sensitive=False)(user_ids)
+        except DatabaseError:
+            logger.exception('Could not read notification states')
+            return
+        for user_id in user_ids:
+            for subscription in list(self.subscriptions.get(user_id, ())):
+                subscription.update(states.get(user_id, (0, 0)))
+
+    async def run(self):
+        try:
+            while self.subscriptions:
+                self.wake.clear()
+                await self.poll()
+                try:
+                    await asyncio.wait_for(self.wake.wait(), STREAM_POLL_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            self.task = None
+
+
+_watchers = weakref.WeakKeyDictionary()
+
+
+def unread_count_watcher():
+    """The watcher for the running event loop"""
+    loop = asyncio.get_running_loop()
+    watcher = _watchers.get(loop)
+    if watcher is None:
+        watcher = _watchers[loop] = UnreadCountWatcher()
+    return watcher
+
+
+async def unread_count_events(user_id, last_version=None):
+    """
+    Server-Sent Events for the unread count: an `unread` event whenever the
+    user's change counter moves (and once on connect unless `last_version`,
+    from Last-Event-ID, is current), keep-alive comments in between, and a
+    close after STREAM_MAX_AGE so the browser reconnects to a fresh worker.
+    """
+    loop = asyncio.get_running_loop()
+    opened = loop.time()
+    last_sent = loop.time()
+    watcher = unread_count_watcher()
+    subscription = watcher.subscribe(user_id)
+    try:
+        yield f'retry: {int(STREAM_POLL_INTERVAL * 1000)}\n\n'
+        while loop.time() - opened < STREAM_MAX_AGE:
+            if subscription.state is not None and subscription.state[0] != last_version:
+                last_version, count = subscription.state
+                last_sent = loop.time()
+                yield f'id: {last_version}\nevent: unread\ndata: {json.dumps({"unread_count": count})}\n\n'
+            elif loop.time() - last_sent >= STREAM_KEEPALIVE:
+                last_sent = loop.time()
+                yield ': keep-alive\n\n'
+            now = loop.time()
+            await subscription.wait(min(STREAM_KEEPALIVE - (now - last_sent), STREAM_MAX_AGE - (now - opened)))
+    finally:
+        watcher.unsubscribe(user_id, subscription)
@@ -0,0 +1,71 @@
+"""
+Notification retention.
+
+Read notifications older than NOTIFICATION_RETENTION_DAYS leave the live
+table in batches, so it and its indexes only hold recent rows. Under the
+'archive' policy each batch is copied into ArchivedNotification first;
+under 'delete' it is simply dropped. Unread notifications are never
+touched, so the per-user unread counters stay correct.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ArchivedNotification, Notification
+
+RETENTION_POLICIES = ('archive', 'delete')
+DEFAULT_BATCH_SIZE = 1000
+
+ARCHIVED_FIELDS = (
+    'id', 'user_id', 'title', 'message', 'notification_type',
+    'order_id', 'product_id', 'action_url', 'created_at',
+)
+
+
+def retention_cutoff(days=None):
+    if days is None:
+        days = getattr(settings, 'NOTIFICATION_RETENTION_DAYS', 90)
+    return timezone.now() - timedelta(days=days)
+
+
+def expire_batch(cutoff, policy, batch_size=DEFAULT_BATCH_SIZE):
+    """Archive or delete one batch of read notifications created before `cutoff`"""
+    with transaction.atomic():
+        rows = list(
+            Notification.objects.select_for_update()
+            .filter(is_read=True, created_at__lt=cutoff)
+            .order_by('created_at')
+            .values(*ARCHIVED_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+        if policy == 'archive':
+            # ignore_conflicts makes a batch retried after a crash harmless
+            ArchivedNotification.objects.bulk_create(
+                [ArchivedNotification(**row) for row in rows], ignore_conflicts=True
+            )
+        Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+    return len(rows)
+
+
+def expire_notifications(days=None, policy=None, batch_size=DEFAULT_BATCH_SIZE, limit=None):
+    """
+    Move read notifications older than `days` out of the live table,
+    one transaction per batch; returns the number moved. `limit` caps the
+    total for a single run.
+    """
+    policy = policy or getattr(settings, 'NOTIFICATION_RETENTION_POLICY', 'archive')
+    if policy not in RETENTION_POLICIES:
+        raise ValueError(f'Unknown notification retention policy {policy!r}')
+    cutoff = retention_cutoff(days)
+
+    expired = 0
+    while limit is None or expired < limit:
+        size = batch_size if limit is None else min(batch_size, limit - expired)
+        moved = expire_batch(cutoff, policy, size)
+        if not moved:
+            break
+        expired += moved
+    return expired
@@ -1,3 +1,154 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import Category, Product
+from .dispatch import broadcast, dispatch_notifications, wishlist_segment
+from .models import ArchivedNotification, Notification, Wishlist
+from .notifications import (
+    delete_notifications, notification_feed, reconcile_unread_counts, set_read_state, unread_count_events,
+    unread_notification_count,
+)
+from .retention import expire_notifications
+
+
+class UnreadCounterTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user('alice')
+        self.bob = User.objects.create_user('bob')
+        context = {'product_id': 1, 'product_name': 'Phone'}
+        dispatch_notifications(
+            [(self.alice, 'product_back_in_stock', context)] * 3 + [(self.bob, 'product_back_in_stock', context)] * 2
+        )
+
+    def counts(self):
+        return unread_notification_count(self.alice.pk), unread_notification_count(self.bob.pk)
+
+    def test_set_read_state_only_counts_changed_rows(self):
+        first_two = Notification.objects.filter(user=self.alice).order_by('pk')[:2].values('pk')
+        self.assertEqual(set_read_state(Notification.objects.filter(pk__in=first_two), True), 2)
+        self.assertEqual(self.counts(), (1, 2))
+
+        # Already read: nothing changes
+        self.assertEqual(set_read_state(Notification.objects.filter(pk__in=first_two), True), 0)
+        self.assertEqual(self.counts(), (1, 2))
+
+        self.assertEqual(set_read_state(Notification.objects.all(), False), 2)
+        self.assertEqual(self.counts(), (3, 2))
+
+    def test_delete_notifications_only_subtracts_unread(self):
+        set_read_state(Notification.objects.filter(pk=Notification.objects.filter(user=self.alice)[0].pk), True)
+        self.assertEqual(delete_notifications(Notification.objects.all()), 5)
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_reconcile_corrects_drift(self):
+        Notification.objects.filter(user=self.bob).update(is_read=True)
+        self.assertEqual(reconcile_unread_counts(), 1)
+        self.assertEqual(self.counts(), (3, 0))
+
+
+class BroadcastTests(TestCase):
+    def test_broadcast_reaches_each_active_wishlister_once(self):
+        category = Category.objects.create(name='Phones', slug='phones')
+        product = Product.objects.create(name='Phone', slug='phone', category=category, description='', price=100)
+        alice, bob, carol = (User.objects.create_user(name) for name in ('alice', 'bob', 'carol'))
+        carol.is_active = False
+        carol.save()
+        for user in (alice, bob, carol):
+            Wishlist.objects.create(user=user, product=product)
+        User.objects.create_user('dave')
+
+        context = {'product_id': product.pk, 'product_name': product.name}
+        self.assertEqual(broadcast(wishlist_segment(product), 'product_back_in_stock', context), 2)
+        self.assertEqual(
+            sorted(Notification.objects.values_list('user__username', 'action_url')),
+            [('alice', f'/products/{product.pk}/'), ('bob', f'/products/{product.pk}/')]
+        )
+        self.assertEqual(unread_notification_count(alice.pk), 1)
+
+
+class NotificationFeedTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        dispatch_notifications(
+            (self.user, 'product_back_in_stock', {'product_id': index, 'product_name': f'Phone {index}'})
+            for index in range(7)
+        )
+        self.newest_first = list(Notification.objects.order_by('-created_at', '-id').values_list('pk', flat=True))
+
+    def test_latest_page_and_unread_count_in_one_query(self):
+        with self.assertNumQueries(1):
+            feed = notification_feed(self.user)
+        self.assertEqual([item['id'] for item in feed['notifications']], self.newest_first[:5])
+        self.assertEqual(feed['unread_count'], 7)
+
+        older = notification_feed(self.user, cursor=feed['next_cursor'])
+        self.assertEqual([item['id'] for item in older['notifications']], self.newest_first[5:])
+        self.assertIsNone(older['next_cursor'])
+
+        # Nothing newer than the latest one, but the unread count still stands
+        since = notification_feed(self.user, since=self.newest_first[0])
+        self.assertEqual((since['notifications'], since['unread_count']), ([], 7))
+
+    def test_repeat_open_gets_304_until_something_changes(self):
+        url = reverse('users:notifications_feed')
+        self.client.force_login(self.user)
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+
+        set_read_state(Notification.objects.filter(pk=self.newest_first[0]), True)
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['unread_count'], 6)
+
+
+class NotificationRetentionTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('alice')
+        old = timezone.now() - timedelta(days=100)
+        for index, is_read in enumerate([True, True, True, False]):
+            notification = Notification.objects.create(
+                user=self.user, title=f'Old {index}', message='', is_read=is_read
+            )
+            # created_at is auto_now_add, so backdate it afterwards
+            Notification.objects.filter(pk=notification.pk).update(created_at=old)
+        self.recent = Notification.objects.create(user=self.user, title='Recent', message='', is_read=True)
+
+    def test_archive_moves_only_old_read_notifications(self):
+        self.assertEqual(expire_notifications(days=90, policy='archive', batch_size=2), 3)
+        self.assertEqual(
+            set(Notification.objects.values_list('title', flat=True)), {'Old 3', 'Recent'}
+        )
+        self.assertEqual(ArchivedNotification.objects.count(), 3)
+
+    def test_delete_policy_and_limit(self):
+        self.assertEqual(expire_notifications(days=90, policy='delete', limit=2), 2)
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertFalse(ArchivedNotification.objects.exists())
+
+    def test_unknown_policy_is_rejected(self):
+        with self.assertRaises(ValueError):
+            expire_notifications(policy='shred')
+
+
+class UnreadCountStreamTests(SimpleTestCase):
+    async def test_streams_share_one_query_per_poll(self):
+        states = {1: (3, 2), 2: (5, 0)}
+        with mock.patch('users.notifications.fetch_notification_states', return_value=states) as fetch:
+            streams = [unread_count_events(1), unread_count_events(2)]
+            for stream in streams:
+                await stream.__anext__()
+            events = [await stream.__anext__() for stream in streams]
+            for stream in streams:
+                await stream.aclose()
+
+        self.assertEqual(events, [
+            'id: 3\nevent: unread\ndata: {"unread_count": 2}\n\n',
+            'id: 5\nevent: unread\ndata: {"unread_count": 0}\n\n',
+        ])
+        fetch.assert_called_once()
+        self.assertCountEqual(fetch.call_args.args[0], [1, 2])
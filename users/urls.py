@@ -21,6 +21,8 @@ urlpatterns = [
     path('wishlist/toggle/<int:product_id>/', views.toggle_wishlist, name='toggle_wishlist'),
     path('payment-methods/', views.payment_methods, name='payment_methods'),
     path('notifications/', views.notifications, name='notifications'),
+    path('notifications/feed/', views.notifications_feed, name='notifications_feed'),
+    path('notifications/stream/', views.notifications_stream, name='notifications_stream'),
     path('notifications/count/', views.get_notifications_count, name='notifications_count'),
     path('notifications/mark-read/<int:notification_id>/', views.mark_notification_read, name='mark_notification_read'),
     path('notifications/mark-all-read/', views.mark_all_notifications_read, name='mark_all_notifications_read'),
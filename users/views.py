@@ -5,9 +5,15 @@ from django.contrib.auth.models import User
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
+from django.db import transaction
+from django.urls import reverse
 from django.utils import timezone
 from .forms import RegistrationForm, LoginForm, ForgotPasswordForm, OTPVerificationForm, ResetPasswordForm, UserEditForm, UserProfileEditForm, AddressForm
 from .models import PasswordResetOTP, UserProfile, Address, Wishlist, Notification
+from .notifications import FEED_SORT, adjust_unread_counts, set_read_state, unread_notification_count
+from products.pagination import KeysetPaginator
+
+NOTIFICATIONS_PAGE_SIZE = 20
 
 def register(request):
     if request.method == 'POST':
@@ -367,17 +373,22 @@ def payment_methods(request):
 @login_required
 def notifications(request):
     user = request.user
-    notifications_list = Notification.objects.filter(user=user).order_by('-created_at')
-    unread_count = notifications_list.filter(is_read=False).count()
+    notifications_list = Notification.objects.filter(user=user)
+    unread_count = unread_notification_count(user.pk)
     
     # Mark notifications as read when viewing the page
     if request.GET.get('mark_read') == 'true':
-        notifications_list.filter(is_read=False).update(is_read=True)
+        set_read_state(notifications_list, True)
         return redirect('users:notifications')
     
+    # Keyset pages over the (user, created_at, id) index
+    page = KeysetPaginator(notifications_list, FEED_SORT, per_page=NOTIFICATIONS_PAGE_SIZE).page(request.GET.get('cursor'))
+    
     context = {
-        'notifications': notifications_list,
+        'notifications': page,
         'unread_count': unread_count,
+        'first_page_url': None if page.is_first else reverse('users:notifications'),
+        'next_page_url': f"{reverse('users:notifications')}?cursor={page.next_cursor}" if page.has_next else None,
         'user': user
     }
     return render(request, 'users/notifications.html', context)
@@ -477,8 +488,62 @@ def get_notifications_count(request):
     """AJAX endpoint to get unread notifications count"""
     from django.http import JsonResponse
     
-    unread_count = Notification.objects.filter(user=request.user, is_read=False).count()
-    return JsonResponse({'unread_count': unread_count})
+    return JsonResponse({'unread_count': unread_notification_count(request.user.pk)})
+
+@login_required
+def notifications_feed(request):
+    """
+    JSON feed for the header dropdown: the latest `limit` notifications and
+    the unread count. Supports `cursor` (older pages) and `since` (newer than
+    a notification id), and answers a matching If-None-Match with 304.
+    """
+    from django.http import JsonResponse
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from .notifications import DEFAULT_FEED_SIZE, feed_etag, notification_feed
+    
+    limit = request.GET.get('limit', '')
+    since = request.GET.get('since', '')
+    feed = notification_feed(
+        request.user,
+        limit=int(limit) if limit.isdigit() else DEFAULT_FEED_SIZE,
+        cursor=request.GET.get('cursor'),
+        since=int(since) if since.isdigit() else None
+    )
+    
+    etag = feed_etag(feed)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(feed)
+    response['ETag'] = etag
+    # Private, and always revalidated so new notifications show up immediately
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+async def notifications_stream(request):
+    """
+    Server-Sent Events stream of the unread count. Needs the ASGI
+    application (flipkart.asgi); under WSGI it answers 204 so the browser
+    stops reconnecting and falls back to polling notifications_count.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import HttpResponse, StreamingHttpResponse
+    from .notifications import unread_count_events
+    
+    user = await request.auser()
+    if not user.is_authenticated:
+        return HttpResponse(status=401)
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+    
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    response = StreamingHttpResponse(
+        unread_count_events(user.pk, int(last_event_id) if last_event_id.isdigit() else None),
+        content_type='text/event-stream'
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 @login_required
 def mark_notification_read(request, notification_id):
@@ -498,20 +563,22 @@ def mark_all_notifications_read(request):
     from django.http import JsonResponse
     
     if request.method == 'POST':
-        updated_count = Notification.objects.filter(user=request.user, is_read=False).update(is_read=True)
+        updated_count = set_read_state(Notification.objects.filter(user=request.user), True)
         return JsonResponse({'success': True, 'message': f'{updated_count} notifications marked as read'})
     
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
 def create_notification(user, title, message, notification_type='general', order_id=None, product_id=None, action_url=None):
     """Helper function to create notifications"""
-    notification = Notification.objects.create(
-        user=user,
-        title=title,
-        message=message,
-        notification_type=notification_type,
-        order_id=order_id,
-        product_id=product_id,
-        action_url=action_url
-    )
+    with transaction.atomic():
+        notification = Notification.objects.create(
+            user=user,
+            title=title,
+            message=message,
+            notification_type=notification_type,
+            order_id=order_id,
+            product_id=product_id,
+            action_url=action_url
+        )
+        adjust_unread_counts({user.pk: 1})
     return notification